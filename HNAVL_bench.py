@@ -0,0 +1,572 @@
+#!/usr/bin/env python3
+# coding=utf-8
+# Copyright (C) 2026 Roy Pfund. All rights reserved.
+#
+# Permission is  hereby  granted,  free  of  charge,  to  any  person
+# obtaining a copy of  this  software  and  associated  documentation
+# files  (the  "Software"),  to  deal   in   the   Software   without
+# restriction, including without limitation the rights to use,  copy,
+# modify, merge, publish, distribute, sublicense, and/or sell  copies
+# of the Software, and to permit persons  to  whom  the  Software  is
+# furnished to do so.
+#
+# The above copyright notice and  this  permission  notice  shall  be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT  WARRANTY  OF  ANY  KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES  OF
+# MERCHANTABILITY,   FITNESS   FOR   A   PARTICULAR    PURPOSE    AND
+# NONINFRINGEMENT.  IN  NO  EVENT  SHALL  THE  AUTHORS  OR  COPYRIGHT
+# OWNER(S) BE LIABLE FOR  ANY  CLAIM,  DAMAGES  OR  OTHER  LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING  FROM,
+# OUT OF OR IN CONNECTION WITH THE  SOFTWARE  OR  THE  USE  OR  OTHER
+# DEALINGS IN THE SOFTWARE.
+######################################################################
+
+# HNAVL_bench.py
+# benchmarks for HNAVLib, run with e.g. `python3 HNAVL_bench.py insert --max-exp 7`
+
+import subprocess, threading, re, os, sys, inspect, shutil, argparse, random, math, fnmatch, json, types
+import time, tracemalloc, contextlib, tempfile, itertools
+
+import HNAVLib
+
+class RecursiveHNAVL(HNAVLib.tree.HNAVL):
+    """The original recursive insert_at_level, kept as a baseline."""
+    def insert_at_level(self, key):
+        new_node_ref = [None]
+
+        def _insert(node, key):
+            if not node:
+                new_node = HNAVLib.tree.Node(key)
+                new_node_ref[0] = new_node
+                return new_node
+            if key < node.key:
+                node.left = _insert(node.left, key)
+            else:
+                node.right = _insert(node.right, key)
+            return self._rebalance(node)
+
+        self.root = _insert(self.root, key)
+        return new_node_ref[0]
+
+    def legacy_insert_path(self, path):
+        """insert_path as it was before equal_range: get_rank, count_key
+        (get_rank + _get_upper_bound) and select for every segment."""
+        steps = self._parse_path(path)
+        last = len(steps) - 1
+        current_tree = self
+        HNAVLib.tree.HNAVL.segment_count += len(steps)
+        for i, (segment, target_index, explicit_index) in enumerate(steps):
+            first_rank = current_tree.get_rank(segment)
+            count = 0 if first_rank == -1 else current_tree._get_upper_bound(segment) - current_tree.get_rank(segment)
+            if i < last and count > 1 and not explicit_index:
+                raise ValueError(f"Ambiguous path: '{segment}'")
+            target_node = None
+            if first_rank != -1:
+                potential = current_tree.select(first_rank + target_index)
+                if potential and potential.key == segment and i < last:
+                    target_node = potential
+            if not target_node:
+                target_node = current_tree.insert_at_level(segment)
+            if i < last:
+                if not target_node.child_tree:
+                    target_node.child_tree = RecursiveHNAVL()
+                current_tree = target_node.child_tree
+
+def legacy_print_tree(level, path_prefix="", is_last=True, parent_prefixes=""):
+    """print_tree as it was before iter_lines: recursive, one print() per line."""
+    def _print_node(node, current_path, node_is_last, prefixes):
+        if not node:
+            return
+        _print_node(node.left, current_path, False, prefixes)
+        full_path = f"{current_path}/{node.key}" if current_path else node.key
+        is_really_last = node_is_last and (node.right is None)
+        marker = "└── " if is_really_last else "├── "
+        print(f"{prefixes}{marker}{full_path}")
+        if node.child_tree and node.child_tree.root:
+            new_prefix = prefixes + ("    " if is_really_last else "│   ")
+            legacy_print_tree(node.child_tree, full_path, True, new_prefix)
+        _print_node(node.right, current_path, node_is_last, prefixes)
+    _print_node(level.root, path_prefix, is_last, parent_prefixes)
+
+def rand_keys(n: int, seed: int = 42):
+    rng = random.Random(seed)
+    return [f"{rng.getrandbits(40):010x}" for _ in range(n)]
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+def bench_insert(max_exp: int = 6):
+    """inserts/sec of insert_at_level: iterative engine vs recursive baseline."""
+    print("=== insert_at_level: inserts/sec ===")
+    print(f"{'n':>10} {'recursive':>12} {'iterative':>12} {'speedup':>8}")
+    for exp in range(4, max_exp + 1):
+        n = 10 ** exp
+        keys = rand_keys(n)
+        rates = []
+        for cls in (RecursiveHNAVL, HNAVLib.tree.HNAVL):
+            t = cls()
+            elapsed, _ = timed(lambda: [t.insert_at_level(k) for k in keys])
+            rates.append(n / elapsed)
+            del t
+        print(f"{n:>10} {rates[0]:>12.0f} {rates[1]:>12.0f} {rates[1] / rates[0]:>7.2f}x")
+
+def rand_paths(n: int, seed: int = 42, fanout: int = 100):
+    """Three-level paths shaped like HNAVLdoc's HNAVL/<Group>/<Op> entries."""
+    rng = random.Random(seed)
+    return [f"HNAVL/Group{rng.randrange(fanout)}/Op{rng.getrandbits(32):08x}" for _ in range(n)]
+
+def bench_memory(max_exp: int = 6):
+    """Bytes of heap held per path stored with insert_path."""
+    print("=== memory: bytes per stored path ===")
+    print(f"{'paths':>10} {'bytes':>14} {'bytes/path':>11}")
+    for exp in range(3, max_exp + 1):
+        n = 10 ** exp
+        paths = rand_paths(n)
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        t = HNAVLib.tree.HNAVL()
+        for p in paths:
+            t.insert_path(p)
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        print(f"{n:>10} {used:>14} {used / n:>11.1f}")
+        del t
+
+def bench_bulk(max_exp: int = 6):
+    """from_paths against a loop of insert_path."""
+    print("=== bulk load: paths/sec ===")
+    print(f"{'paths':>10} {'insert_path':>12} {'from_paths':>12} {'presorted':>12}")
+    for exp in range(3, max_exp + 1):
+        n = 10 ** exp
+        paths = rand_paths(n)
+        def _loop():
+            t = HNAVLib.tree.HNAVL()
+            for p in paths:
+                t.insert_path(p)
+        loop, _ = timed(_loop)
+        bulk, _ = timed(HNAVLib.tree.HNAVL.from_paths, paths)
+        ordered = sorted(paths, key=lambda p: p.split("/"))
+        pre, _ = timed(HNAVLib.tree.HNAVL.from_paths, ordered, True)
+        print(f"{n:>10} {n / loop:>12.0f} {n / bulk:>12.0f} {n / pre:>12.0f}")
+
+def bench_walks(max_exp: int = 6):
+    """Root-to-leaf walks per path segment: legacy insert_path vs equal_range."""
+    print("=== insert_path: walks per segment ===")
+    print(f"{'paths':>10} {'legacy w/seg':>13} {'legacy p/s':>11} {'fused w/seg':>12} {'fused p/s':>10}")
+    HNAVL = HNAVLib.tree.HNAVL
+    for exp in range(3, max_exp + 1):
+        n = 10 ** exp
+        paths = rand_paths(n)
+        row = []
+        for make, method in ((RecursiveHNAVL, "legacy_insert_path"), (HNAVL, "insert_path")):
+            t = make()
+            insert = getattr(t, method)
+            HNAVL.walk_count = HNAVL.segment_count = 0
+            elapsed, _ = timed(lambda: [insert(p) for p in paths])
+            row += [HNAVL.walk_count / HNAVL.segment_count, n / elapsed]
+        print(f"{n:>10} {row[0]:>13.2f} {row[1]:>11.0f} {row[2]:>12.2f} {row[3]:>10.0f}")
+
+def bench_cache(max_exp: int = 6):
+    """Repeated insert_path/resolve_path over a few thousand distinct paths, cache off vs on."""
+    print("=== path cache: ops/sec over 2000 distinct paths ===")
+    print(f"{'ops':>10} {'resolve off':>12} {'resolve on':>12} {'insert off':>12} {'insert on':>12} {'hit rate':>9}")
+    HNAVL = HNAVLib.tree.HNAVL
+    distinct = [f"HNAVL/ListOps/Op{i}/impl/[0]/v{i % 7}" for i in range(2000)]
+    tree = HNAVL.from_paths(distinct)
+    saved = HNAVL.path_cache
+    for exp in range(4, max_exp + 1):
+        n = 10 ** exp
+        workload = [distinct[i % len(distinct)] for i in range(n)]
+        row = []
+        for maxsize in (0, 4096):
+            HNAVL.path_cache = HNAVLib.tree.PathCache(maxsize)
+            elapsed, _ = timed(lambda: [tree.resolve_path(p) for p in workload])
+            row.append(n / elapsed)
+        for maxsize in (0, 4096):
+            HNAVL.path_cache = cache = HNAVLib.tree.PathCache(maxsize)
+            t = HNAVL()
+            elapsed, _ = timed(lambda: [t.insert_path(p) for p in workload])
+            row.append(n / elapsed)
+        print(f"{n:>10} {row[0]:>12.0f} {row[1]:>12.0f} {row[2]:>12.0f} {row[3]:>12.0f} {cache.hits / n:>9.1%}")
+    HNAVL.path_cache = saved
+
+class PathRecorder:
+    """Stands in for an HNAVL to capture the paths HNAVLdoc inserts."""
+    def __init__(self):
+        self.paths = []
+
+    def insert_path(self, path):
+        self.paths.append(path)
+
+def doc_paths(scale: int):
+    """populateintoHNAVL's paths, replicated `scale` times under HNAVL/Copy<r>."""
+    recorder = PathRecorder()
+    HNAVLib.HNAVLdoc.populateintoHNAVL(recorder)
+    paths = ["HNAVL"]
+    for r in range(scale):
+        paths += [p.replace("HNAVL", f"HNAVL/Copy{r}", 1) for p in recorder.paths]
+    return paths
+
+def bench_batch(max_exp: int = 6):
+    """insert_paths against a loop of insert_path, into an empty and a populated tree."""
+    print("=== batch insert: paths/sec (populateintoHNAVL scaled) ===")
+    print(f"{'scale':>8} {'paths':>9} {'loop':>10} {'batch':>10} {'loop+pop':>10} {'batch+pop':>10}")
+    HNAVL = HNAVLib.tree.HNAVL
+    for exp in range(1, max_exp):
+        scale = 10 ** exp
+        paths = doc_paths(scale)
+        # the populated case re-adds a leaf under every existing op
+        extra = [p + "/[0]/impl" for p in paths[1:] if p.count("/") == 3]
+        row = []
+        for batch in (paths, extra):
+            base = HNAVL() if batch is paths else HNAVL.from_paths(paths)
+            def _loop():
+                for p in batch:
+                    base.insert_path(p)
+            row.append(len(batch) / timed(_loop)[0])
+            base = HNAVL() if batch is paths else HNAVL.from_paths(paths)
+            # single-threaded, so pausing the collector is safe here
+            row.append(len(batch) / timed(lambda: base.insert_paths(batch, pause_gc=True))[0])
+        print(f"{scale:>8} {len(paths):>9} {row[0]:>10.0f} {row[1]:>10.0f} {row[2]:>10.0f} {row[3]:>10.0f}")
+
+def bench_merge(max_exp: int = 6):
+    """merge_sorted against a loop of insert_at_level for k new keys into n."""
+    print("=== merge_sorted: seconds to add k sorted keys to a level of n ===")
+    print(f"{'n':>10} {'k/n':>6} {'loop':>9} {'merge':>9}")
+    HNAVL = HNAVLib.tree.HNAVL
+    for exp in range(3, max_exp + 1):
+        n = 10 ** exp
+        base = sorted(rand_keys(n, seed=1))
+        for ratio in (0.001, 0.01, 0.1, 0.5, 1.0, 4.0):
+            k = max(1, int(n * ratio))
+            run = sorted(rand_keys(k, seed=2))
+            level = HNAVL.from_paths(base)
+            loop, _ = timed(lambda: [level.insert_at_level(key) for key in run])
+            level = HNAVL.from_paths(base)
+            merge, _ = timed(level.merge_sorted, run)
+            print(f"{n:>10} {ratio:>6} {loop:>9.4f} {merge:>9.4f}")
+
+def bench_print(max_exp: int = 6):
+    """Dumping the hierarchy: recursive print() per line vs iter_lines + chunked writes."""
+    print("=== print_tree: lines/sec into a line-buffered file (like a terminal) ===")
+    print(f"{'paths':>10} {'recursive':>12} {'chunked':>12} {'iter_paths':>12}")
+    for exp in range(3, max_exp + 1):
+        n = 10 ** exp
+        tree = HNAVLib.tree.HNAVL.from_paths(rand_paths(n))
+        lines = sum(1 for _ in tree.iter_paths())
+        with open(os.devnull, "w", buffering=1, encoding="utf-8") as sink:
+            with contextlib.redirect_stdout(sink):
+                old, _ = timed(legacy_print_tree, tree)
+            new, _ = timed(tree.print_tree, 0, "", True, "", sink)
+        walk, _ = timed(lambda: sum(1 for _ in tree.iter_paths()))
+        print(f"{n:>10} {lines / old:>12.0f} {lines / new:>12.0f} {lines / walk:>12.0f}")
+
+def bench_soak(max_exp: int = 6):
+    """Insert/delete churn on a resident hierarchy: heap should stay flat."""
+    print("=== soak: insert then delete_path the same paths, round after round ===")
+    n = 10 ** min(max_exp, 5)
+    resident = HNAVLib.tree.HNAVL.from_paths(rand_paths(n, seed=1))
+    print(f"{'round':>6} {'inserts/s':>10} {'deletes/s':>10} {'heap bytes':>12}")
+    # The shared path cache fills up with each round's new paths; it is
+    # emptied before every reading so only the hierarchy's own nodes count.
+    cache = HNAVLib.tree.HNAVL.path_cache
+    cache.clear()
+    tracemalloc.start()
+    for rnd in range(8):
+        churn = [f"{p}/[0]/round{rnd}" for p in rand_paths(n, seed=1)[: n // 2]]
+        grow, _ = timed(lambda: [resident.insert_path(p) for p in churn])
+        shrink, _ = timed(lambda: [resident.delete_path(p) for p in churn])
+        rate = (len(churn) / grow, len(churn) / shrink)
+        del churn
+        cache.clear()
+        print(f"{rnd:>6} {rate[0]:>10.0f} {rate[1]:>10.0f} {tracemalloc.get_traced_memory()[0]:>12}")
+    tracemalloc.stop()
+
+def bench_snapshot(max_exp: int = 6):
+    """save / open / first lookup / lookups per second on a mapped snapshot."""
+    print("=== snapshot: save, mmap open and lookups ===")
+    print(f"{'paths':>10} {'MB':>7} {'save s':>8} {'open ms':>8} {'1st ms':>7} {'mapped/s':>9} {'memory/s':>9} {'rebuild s':>9}")
+    HNAVL = HNAVLib.tree.HNAVL
+    with tempfile.TemporaryDirectory() as tmp:
+        for exp in range(3, max_exp + 1):
+            n = 10 ** exp
+            paths = rand_paths(n)
+            tree = HNAVL.from_paths(paths)
+            file = os.path.join(tmp, f"{n}.snap")
+            save, _ = timed(tree.save, file)
+            opened, mapped = timed(HNAVL.open, file)
+            probe = random.Random(3).sample(paths, min(n, 20000))
+            first, _ = timed(mapped.resolve_path, probe[0])
+            lookups, _ = timed(lambda: [mapped.resolve_path(p) for p in probe])
+            memory, _ = timed(lambda: [tree.resolve_path(p) for p in probe])
+            rebuild, _ = timed(HNAVL.from_paths, paths)
+            print(f"{n:>10} {os.path.getsize(file) / 2**20:>7.1f} {save:>8.3f} {opened * 1e3:>8.3f} {first * 1e3:>7.3f} "
+                  f"{len(probe) / lookups:>9.0f} {len(probe) / memory:>9.0f} {rebuild:>9.3f}")
+            del mapped
+
+def bench_wal(max_exp: int = 6):
+    """insert_path/sec without a log and under each fsync policy, plus replay speed."""
+    print("=== wal: sustained insert_path and recovery ===")
+    print(f"{'paths':>10} {'no log/s':>9} {'never/s':>9} {'batch/s':>9} {'always/s':>9} {'replay/s':>9}")
+    Durable = HNAVLib.wal.DurableHNAVL
+    with tempfile.TemporaryDirectory() as tmp:
+        for exp in range(3, max_exp + 1):
+            n = 10 ** exp
+            paths = rand_paths(n)
+            plain = HNAVLib.tree.HNAVL()
+            base, _ = timed(lambda: [plain.insert_path(p) for p in paths])
+            rates = {}
+            for policy in ("never", "batch", "always"):
+                # fsync per record is slow on real disks; cap it at 10^4 paths
+                sample = paths if policy != "always" else paths[:10000]
+                snap, log = os.path.join(tmp, f"{policy}{n}.snap"), os.path.join(tmp, f"{policy}{n}.wal")
+                db = Durable(snap, log, fsync=policy)
+                elapsed, _ = timed(lambda: ([db.insert_path(p) for p in sample], db.commit()))
+                db.close()
+                rates[policy] = len(sample) / elapsed
+            db = Durable(os.path.join(tmp, f"batch{n}.snap"), os.path.join(tmp, f"batch{n}.wal"))
+            print(f"{n:>10} {n / base:>9.0f} {rates['never']:>9.0f} {rates['batch']:>9.0f} {rates['always']:>9.0f} "
+                  f"{db.recovery['records_per_sec']:>9.0f}")
+            db.close()
+
+def bench_intern(max_exp: int = 6):
+    """Heap bytes per path and insert/resolve rates with and without key interning."""
+    print("=== intern: shared symbol table off vs on ===")
+    print(f"{'paths':>10} {'shape':>6} {'B/path off':>10} {'B/path on':>10} {'ins/s off':>10} {'ins/s on':>10} "
+          f"{'res/s off':>10} {'res/s on':>10}")
+    HNAVL = HNAVLib.tree.HNAVL
+    default = HNAVL.intern_keys
+    for exp in range(3, max_exp + 1):
+        n = 10 ** exp
+        # HNAVLdoc repeats the same operation names under every copy
+        shapes = {"doc": doc_paths(n // 100 + 1)[:n], "rand": rand_paths(n)}
+        for shape, paths in shapes.items():
+            probe = random.Random(5).sample(paths, min(len(paths), 20000))
+            stats = {}
+            for intern in (False, True):
+                HNAVL.intern_keys = intern
+                # the path cache is left out of the heap figure
+                cache_size = HNAVL.path_cache.maxsize
+                HNAVL.path_cache.resize(0)
+                tracemalloc.start()
+                before = tracemalloc.get_traced_memory()[0]
+                t = HNAVL()
+                for p in paths:
+                    t.insert_path(p)
+                used = tracemalloc.get_traced_memory()[0] - before
+                tracemalloc.stop()
+                HNAVL.path_cache.resize(cache_size)
+                insert = min(timed(lambda: [t2.insert_path(p) for t2 in [HNAVL()] for p in paths])[0] for _ in range(3))
+                resolve = min(timed(lambda: [t.resolve_path(p) for p in probe])[0] for _ in range(3))
+                stats[intern] = (used / len(paths), len(paths) / insert, len(probe) / resolve)
+                del t
+            HNAVL.intern_keys = default
+            off, on = stats[False], stats[True]
+            print(f"{len(paths):>10} {shape:>6} {off[0]:>10.1f} {on[0]:>10.1f} {off[1]:>10.0f} {on[1]:>10.0f} "
+                  f"{off[2]:>10.0f} {on[2]:>10.0f}")
+
+def bench_persistent(max_exp: int = 6):
+    """insert_path in place vs path-copying versions, and heap per retained version."""
+    print("=== persistent: copy-on-write versions ===")
+    print(f"{'paths':>10} {'in place/s':>11} {'versioned/s':>12} {'delete/s':>9} {'B/version':>10}")
+    HNAVL = HNAVLib.tree.HNAVL
+    for exp in range(3, max_exp + 1):
+        n = 10 ** exp
+        paths = rand_paths(n)
+        plain = HNAVL()
+        inplace, _ = timed(lambda: [plain.insert_path(p) for p in paths])
+        store = HNAVLib.persistent.PersistentHNAVL()
+        versioned, _ = timed(lambda: [store.insert_path(p) for p in paths])
+        # 1000 more inserts while a reader keeps every version alive
+        extra = [f"{p}/[0]/v" for p in paths[:1000]]
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        held = [store.insert_path(p) for p in extra]
+        retained = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del held
+        delete, _ = timed(lambda: [store.delete_path(p) for p in extra])
+        print(f"{n:>10} {n / inplace:>11.0f} {n / versioned:>12.0f} {len(extra) / delete:>9.0f} {retained / len(extra):>10.0f}")
+
+class GlobalLockHNAVL:
+    """Baseline for bench_concurrent: one mutex around a plain HNAVL."""
+    def __init__(self, tree):
+        self.tree = tree
+        self.lock = threading.Lock()
+
+    def insert_path(self, path):
+        with self.lock:
+            self.tree.insert_path(path)
+
+    def resolve_path(self, path):
+        with self.lock:
+            return self.tree.resolve_path(path)
+
+def run_mixed(shared, paths, threads: int, read_share: float, seconds: float) -> tuple:
+    """Each thread mixes resolve_path and insert_path for `seconds`; returns (lookups/s, inserts/s)."""
+    counts = [[0, 0] for _ in range(threads)]
+    stop = threading.Event()
+
+    def work(t):
+        rng = random.Random(t)
+        count = counts[t]
+        while not stop.is_set():
+            p = rng.choice(paths)
+            if rng.random() < read_share:
+                shared.resolve_path(p)
+                count[0] += 1
+            else:
+                shared.insert_path(f"{p}/[0]/t{t}")
+                count[1] += 1
+
+    workers = [threading.Thread(target=work, args=(t,)) for t in range(threads)]
+    for w in workers:
+        w.start()
+    time.sleep(seconds)
+    stop.set()
+    for w in workers:
+        w.join()
+    return sum(c[0] for c in counts) / seconds, sum(c[1] for c in counts) / seconds
+
+def bench_concurrent(max_exp: int = 6):
+    """Lookups/sec from a thread pool under mixed read/write ratios: global mutex vs per-level RW locks."""
+    print("=== concurrent: 4 threads mixing resolve_path and insert_path ===")
+    n = 10 ** min(max_exp, 5)
+    paths = rand_paths(n)
+    print(f"{'reads %':>8} {'mutex look/s':>13} {'mutex ins/s':>12} {'level look/s':>13} {'level ins/s':>12}")
+    for read_share in (0.5, 0.9, 0.99, 1.0):
+        row = []
+        for wrap in (GlobalLockHNAVL, HNAVLib.locking.ConcurrentHNAVL):
+            shared = wrap(HNAVLib.tree.HNAVL.from_paths(paths))
+            row += run_mixed(shared, paths, 4, read_share, 1.0)
+        print(f"{read_share * 100:>8.0f} {row[0]:>13.0f} {row[1]:>12.0f} {row[2]:>13.0f} {row[3]:>12.0f}")
+
+def bench_parallel(max_exp: int = 6):
+    """parallel_build speedup over from_paths from 1 worker up to the core count."""
+    n = 10 ** max_exp
+    # drop rand_paths' common "HNAVL/" so there are many top-level segments
+    paths = [p.split("/", 1)[1] for p in rand_paths(n)]
+    cores = os.cpu_count() or 1
+    print(f"=== parallel: building {n} paths, {cores} cores ===")
+    print(f"{'workers':>8} {'seconds':>8} {'speedup':>8}")
+    HNAVL = HNAVLib.tree.HNAVL
+    base, _ = timed(HNAVL.from_paths, paths)
+    print(f"{'serial':>8} {base:>8.3f} {1.0:>8.2f}")
+    for workers in range(2, max(cores, 2) + 1):
+        elapsed, _ = timed(HNAVL.parallel_build, paths, workers)
+        print(f"{workers:>8} {elapsed:>8.3f} {base / elapsed:>8.2f}")
+
+def bench_range(max_exp: int = 6):
+    """Reading k consecutive ranks: a loop of select vs iter_ranks, plus count_range."""
+    print("=== range: seconds to read k consecutive nodes from a level of n ===")
+    print(f"{'n':>10} {'k':>8} {'select':>9} {'iter':>9} {'count µs':>9}")
+    HNAVL = HNAVLib.tree.HNAVL
+    for exp in range(3, max_exp + 1):
+        n = 10 ** exp
+        keys = sorted(rand_keys(n))
+        level = HNAVL.from_paths(keys, presorted=True)
+        i = n // 3
+        for k in sorted({10, min(1000, n // 2), n // 2}):
+            loop, _ = timed(lambda: [level.select(r) for r in range(i, i + k)])
+            walk, _ = timed(lambda: list(level.iter_ranks(i, i + k)))
+            count, _ = timed(level.count_range, keys[i], keys[min(i + k, n - 1)])
+            print(f"{n:>10} {k:>8} {loop:>9.5f} {walk:>9.5f} {count * 1e6:>9.1f}")
+
+def glob_match(segments, parts):
+    """Brute-force segment matcher: fnmatch per segment, `**` for any number of them."""
+    if not segments:
+        return not parts
+    if segments[0] == "**":
+        return glob_match(segments[1:], parts) or bool(parts) and glob_match(segments, parts[1:])
+    return bool(parts) and fnmatch.fnmatchcase(parts[0], segments[0]) and glob_match(segments[1:], parts[1:])
+
+def bench_query(max_exp: int = 6):
+    """query(pattern) against a full iter_paths walk with a per-segment fnmatch."""
+    print("=== query: glob patterns over HNAVLdoc copies ===")
+    print(f"{'paths':>10} {'pattern':<28} {'hits':>6} {'brute s':>9} {'query s':>9}")
+    patterns = ("HNAVL/Copy7/ListOps/Delete*", "HNAVL/Copy7/**/Insert*", "HNAVL/Copy1*/TreeOps/Search",
+                "HNAVL/*/TreeOps/Delete*", "**/Search")
+    for exp in range(3, max_exp + 1):
+        paths = doc_paths(10 ** exp // 100 + 1)
+        tree = HNAVLib.tree.HNAVL.from_paths(paths)
+        for pattern in patterns:
+            segments = pattern.split("/")
+            brute, hits = timed(lambda: [p for d, p, n in tree.iter_paths() if glob_match(segments, p.split("/"))])
+            fast, found = timed(lambda: [p for p, n in tree.query(pattern)])
+            assert sorted(found) == sorted(hits)
+            print(f"{len(paths):>10} {pattern:<28} {len(hits):>6} {brute:>9.4f} {fast:>9.4f}")
+
+def bench_select_path(max_exp: int = 6):
+    """Random access into the flattened iter_paths order: a linear walk vs select_path."""
+    print("=== select_path: seconds per access to position i of the flattened order ===")
+    print(f"{'paths':>10} {'walk':>10} {'select':>10} {'rank':>10} {'page of 100':>12}")
+    HNAVL = HNAVLib.tree.HNAVL
+    HNAVL.track_totals = True
+    for exp in range(3, max_exp + 1):
+        tree = HNAVL.from_paths(doc_paths(10 ** exp // 100 + 1))
+        n = tree.count_paths()
+        rng = random.Random(exp)
+        picks = [rng.randrange(n) for _ in range(20)]
+        walk, _ = timed(lambda: [next(itertools.islice(tree.iter_paths(), i, None)) for i in picks])
+        select, found = timed(lambda: [tree.select_path(i) for i in picks * 50])
+        # rank_path needs unambiguous paths: HNAVLdoc copies have no duplicate siblings
+        rank, ranks = timed(lambda: [tree.rank_path(p) for p, node in found])
+        assert ranks == picks * 50
+        page, _ = timed(lambda: [list(itertools.islice(tree.iter_paths(start=i), 100)) for i in picks])
+        print(f"{n:>10} {walk / len(picks):>10.6f} {select / len(found):>10.6f} {rank / len(found):>10.6f} {page / len(picks):>12.6f}")
+    HNAVL.track_totals = False
+
+def bench_totals(max_exp: int = 6):
+    """What keeping Node.total costs: insert_at_level and insert_path rates with track_totals off vs on."""
+    print("=== track_totals: inserts/sec off vs on ===")
+    print(f"{'n':>10} {'level off':>10} {'level on':>10} {'path off':>10} {'path on':>10}")
+    HNAVL = HNAVLib.tree.HNAVL
+    for exp in range(4, max_exp + 1):
+        n = 10 ** exp
+        keys, paths = rand_keys(n), rand_paths(n)
+        rates = {}
+        for track in (False, True):
+            HNAVL.track_totals = track
+            level = min(timed(lambda: [t.insert_at_level(k) for t in [HNAVL()] for k in keys])[0] for _ in range(3))
+            path = min(timed(lambda: [t.insert_path(p) for t in [HNAVL()] for p in paths])[0] for _ in range(3))
+            rates[track] = (n / level, n / path)
+        HNAVL.track_totals = False
+        print(f"{n:>10} {rates[False][0]:>10.0f} {rates[True][0]:>10.0f} {rates[False][1]:>10.0f} {rates[True][1]:>10.0f}")
+
+BENCHMARKS = {
+    "insert": bench_insert,
+    "memory": bench_memory,
+    "bulk": bench_bulk,
+    "walks": bench_walks,
+    "cache": bench_cache,
+    "batch": bench_batch,
+    "merge": bench_merge,
+    "print": bench_print,
+    "soak": bench_soak,
+    "snapshot": bench_snapshot,
+    "wal": bench_wal,
+    "intern": bench_intern,
+    "persistent": bench_persistent,
+    "concurrent": bench_concurrent,
+    "parallel": bench_parallel,
+    "range": bench_range,
+    "query": bench_query,
+    "select_path": bench_select_path,
+    "totals": bench_totals,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="HNAVLib benchmarks")
+    parser.add_argument("names", nargs="*", default=list(BENCHMARKS), help=f"any of {', '.join(BENCHMARKS)}")
+    parser.add_argument("--max-exp", type=int, default=5, help="largest problem size as a power of ten")
+    args = parser.parse_args()
+    for name in args.names:
+        BENCHMARKS[name](args.max_exp)
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -26,9 +26,752 @@
 # HNAVL_test.py
 
 import subprocess, threading, re, os, sys, inspect, shutil, argparse, random, math, fnmatch, json, types
+import io, functools, gc
 
 import HNAVLib
 
+def with_totals(test):
+    """Runs a test with HNAVL.track_totals on, so Node.total is kept and checked."""
+    @functools.wraps(test)
+    def run():
+        HNAVLib.tree.HNAVL.track_totals = True
+        try:
+            test()
+        finally:
+            HNAVLib.tree.HNAVL.track_totals = False
+    return run
+
+def check_level(level):
+    """Assert the AVL/size invariants of one level and return its in-order keys."""
+    keys = []
+    def _check(node):
+        if not node:
+            return 0, 0, 0
+        lh, ls, lt = _check(node.left)
+        keys.append(node.key)
+        rh, rs, rt = _check(node.right)
+        assert abs(lh - rh) <= 1, f"unbalanced at {node.key!r}"
+        assert node.height == 1 + max(lh, rh), f"stale height at {node.key!r}"
+        assert node.size == 1 + ls + rs, f"stale size at {node.key!r}"
+        nested = node.child_tree.root.total if node.child_tree and node.child_tree.root else 0
+        if HNAVLib.tree.HNAVL.track_totals:
+            assert node.total == 1 + lt + rt + nested, f"stale total at {node.key!r}"
+        return node.height, node.size, node.total
+    _check(level.root)
+    assert keys == sorted(keys), "in-order keys are not sorted"
+    return keys
+
+def test_insert_at_level():
+    random.seed(7)
+    level = HNAVLib.tree.HNAVL()
+    keys = [random.choice("abcdefgh") + str(random.randrange(50)) for _ in range(2000)]
+    nodes = [level.insert_at_level(k) for k in keys]
+    assert check_level(level) == sorted(keys)
+    # duplicates keep insertion order (each new one lands after the existing ones)
+    first_a0 = [n for n, k in zip(nodes, keys) if k == keys[0]]
+    rank = level.get_rank(keys[0])
+    assert [level.select(rank + i) for i in range(len(first_a0))] == first_a0
+
+def flatten(level):
+    """Nested [(key, children), ...] view of a hierarchy, checking every level."""
+    check_level(level)
+    out = []
+    def _walk(node):
+        if node:
+            _walk(node.left)
+            out.append((node.key, flatten(node.child_tree) if node.child_tree else []))
+            _walk(node.right)
+    _walk(level.root)
+    return out
+
+def rand_dup_paths(n: int, seed: int = 11):
+    """Short paths over a tiny alphabet, so duplicates and [n] indices are common."""
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(n):
+        parts = []
+        for _ in range(rng.randint(1, 4)):
+            parts.append(rng.choice("abc"))
+            if rng.random() < 0.3:
+                parts.append(f"[{rng.randrange(3)}]")
+        paths.append("/".join(parts))
+    return paths
+
+def insert_each(paths):
+    """Sequential insert_path, skipping (and returning only) the unambiguous paths."""
+    tree = HNAVLib.tree.HNAVL()
+    kept = []
+    for p in paths:
+        try:
+            tree.insert_path(p)
+            kept.append(p)
+        except ValueError:
+            pass
+    return tree, kept
+
+def test_get_rank_duplicates():
+    level = HNAVLib.tree.HNAVL()
+    for _ in range(7):
+        level.insert_at_level("a")
+    assert level.get_rank("a") == 0
+    assert level.count_key("a") == 7
+
+@with_totals
+def test_from_paths():
+    tree, kept = insert_each(rand_dup_paths(3000))
+    assert flatten(HNAVLib.tree.HNAVL.from_paths(kept)) == flatten(tree)
+    tree, kept = insert_each(sorted(kept, key=lambda p: p.split("/")))
+    assert flatten(HNAVLib.tree.HNAVL.from_paths(iter(kept), presorted=True)) == flatten(tree)
+    try:
+        HNAVLib.tree.HNAVL.from_paths(["b/x", "a/x"], presorted=True)
+        assert False, "unsorted input accepted"
+    except ValueError:
+        pass
+    try:
+        HNAVLib.tree.HNAVL.from_paths(["a", "a", "a/x"])
+        assert False, "ambiguous path accepted"
+    except ValueError:
+        pass
+
+def test_parallel_build():
+    rng = random.Random(9)
+    paths = [f"t{rng.randrange(40)}/{p}" for p in rand_dup_paths(3000, seed=8)] + rand_dup_paths(300, seed=3)
+    tree, kept = insert_each(paths)
+    built = HNAVLib.tree.HNAVL.parallel_build(kept, workers=3)
+    assert flatten(built) == flatten(tree)
+    assert flatten(HNAVLib.tree.HNAVL.parallel_build(kept, workers=1)) == flatten(tree)
+    try:
+        HNAVLib.tree.HNAVL.parallel_build(["t1", "t1", "t2", "t1/x"], workers=2)
+        assert False, "ambiguous path accepted"
+    except ValueError:
+        pass
+
+def test_equal_range():
+    random.seed(3)
+    level = HNAVLib.tree.HNAVL()
+    for _ in range(500):
+        level.insert_at_level(random.choice("bdfh"))
+    keys = check_level(level)
+    for key in "abcdefghi":
+        for occurrence in (0, 1, 5, 1000, -1):
+            first_rank, count, first_node, nth_node = level.equal_range(key, occurrence)
+            assert count == keys.count(key)
+            if not count:
+                assert (first_rank, first_node, nth_node) == (-1, None, None)
+                continue
+            assert first_rank == keys.index(key) == level.get_rank(key)
+            assert first_node is level.select(first_rank) is level.find_first(key)
+            expected = level.select(first_rank + occurrence) if 0 <= occurrence < count else None
+            assert nth_node is expected
+
+def test_insert_path_walks():
+    tree = HNAVLib.tree.HNAVL()
+    HNAVLib.HNAVLdoc.populateintoHNAVL(tree)
+    walks, segments = HNAVLib.tree.HNAVL.walk_count, HNAVLib.tree.HNAVL.segment_count
+    tree.insert_path("HNAVL/TreeOps/Balance/[0]/AVL")
+    # one equal_range per reused segment plus the final insertion
+    assert HNAVLib.tree.HNAVL.segment_count - segments == 4
+    assert HNAVLib.tree.HNAVL.walk_count - walks == 4
+    # the new segments below a missing one are linked in with one insertion
+    walks = HNAVLib.tree.HNAVL.walk_count
+    tree.insert_path("HNAVL/Missing/Deeper/Leaf")
+    assert HNAVLib.tree.HNAVL.walk_count - walks == 3
+    flatten(tree)
+
+def test_ranges():
+    random.seed(13)
+    level = HNAVLib.tree.HNAVL()
+    nodes = [level.insert_at_level(random.choice("abcdefgh") + str(random.randrange(9))) for _ in range(1500)]
+    ordered = sorted(nodes, key=lambda n: n.key)  # stable: duplicates stay in insertion order
+    for i, j in [(0, 1500), (0, 0), (700, 710), (1499, 1500), (1490, 2000), (-5, 3), (20, 10)]:
+        assert list(level.iter_ranks(i, j)) == ordered[max(i, 0):j]
+    assert list(level.iter_ranks(1400)) == ordered[1400:]
+    for lo, hi in [(None, None), ("b", "d"), ("b3", "b3"), ("b3", "b4"), (None, "c"), ("g5", None), ("z", None), ("d", "a")]:
+        expected = [n for n in ordered if (lo is None or lo <= n.key) and (hi is None or n.key < hi)]
+        assert list(level.iter_range(lo, hi)) == expected
+        assert level.count_range(lo, hi) == len(expected)
+
+    tree = HNAVLib.tree.HNAVL()
+    for k in ("b", "a", "c", "b", "d"):
+        tree.insert_at_level(k)
+    buf = io.BytesIO()
+    HNAVLib.snapshot.write(tree, buf)
+    mapped = HNAVLib.snapshot.loads(buf.getvalue())
+    assert (mapped.count_range("b", "d"), mapped.count_range(), mapped.count_range("c")) == (3, 5, 2)
+    assert not mapped.materialized
+    assert [n.key for n in mapped.iter_range("b", "d")] == ["b", "b", "c"]
+
+def test_path_cache():
+    cache = HNAVLib.tree.PathCache(maxsize=2)
+    assert cache.get("bar/foo/[1]/orange") == (("bar", 0, False), ("foo", 1, True), ("orange", 0, False))
+    cache.get("bar/foo/[1]/orange")
+    cache.get("a")
+    cache.get("b")  # evicts the least recently used entry
+    assert (len(cache), cache.hits, cache.misses) == (2, 1, 3)
+    cache.get("bar/foo/[1]/orange")
+    assert cache.misses == 4
+    cache.resize(0)
+    assert len(cache) == 0
+
+def test_symbol_table():
+    assert HNAVLib.tree.HNAVL.intern_keys is False
+    plain = HNAVLib.tree.HNAVL()
+    plain.insert_path("a/b/c")
+    assert plain.symbols is None
+
+    HNAVLib.tree.HNAVL.intern_keys = True
+    try:
+        tree = HNAVLib.tree.HNAVL()
+        HNAVLib.HNAVLdoc.populateintoHNAVL(tree)
+        batch = HNAVLib.tree.HNAVL.from_paths(["x/Search", "y/Search", "y/[0]/Search"])
+        for t in (tree, batch):
+            # every node holding a key shares the table's str, leaves included
+            keys = {}
+            for depth, path, node in t.iter_paths():
+                assert keys.setdefault(node.key, node.key) is node.key
+                assert t.symbols.lookup(node.key) is node.key
+            assert len(t.symbols) == len(keys)
+        assert tree.resolve_path("HNAVL/ListOps").child_tree.symbols is None
+        assert set(batch.symbols._table) == {"x", "y", "Search"}
+
+        # lookups through the wrappers never add symbols
+        wrapped = HNAVLib.locking.ConcurrentHNAVL()
+        wrapped.insert_path("kept/leaf")
+        assert wrapped.resolve_path("missing/leaf") is None
+        assert wrapped.delete_path("other/leaf") is None
+        assert set(wrapped.tree.symbols._table) == {"kept", "leaf"}
+
+        # the table only grows
+        churn = HNAVLib.tree.HNAVL()
+        for i in range(100):
+            churn.insert_path(f"k{i}/leaf")
+            churn.delete_path(f"k{i}")
+        assert len(churn.symbols) == 101
+    finally:
+        HNAVLib.tree.HNAVL.intern_keys = False
+
+def test_resolve_path():
+    tree = HNAVLib.tree.HNAVL()
+    for p in ("bar", "bar/foo", "bar/foo", "bar/foo/[0]/apple", "bar/foo/[1]/orange"):
+        tree.insert_path(p)
+    assert tree.resolve_path("bar/foo/[1]/orange").key == "orange"
+    assert tree.resolve_path("bar/foo/[0]/orange") is None
+    assert tree.resolve_path("bar/foo/[2]/orange") is None
+    assert tree.resolve_path("bar/foo") is tree.resolve_path("bar/foo/[0]")
+    assert tree.resolve_path("bar/foo/[1]") is not tree.resolve_path("bar/foo/[0]")
+    try:
+        tree.resolve_path("bar/foo/apple")
+        assert False, "ambiguous path resolved"
+    except ValueError:
+        pass
+
+def test_contains_path_readers():
+    tree = HNAVLib.tree.HNAVL()
+    HNAVLib.HNAVLdoc.populateintoHNAVL(tree)
+    before = flatten(tree)
+    assert tree.contains_path("HNAVL/ListOps/Concat")
+    assert not tree.contains_path("HNAVL/ListOps/Concat/deeper")
+    assert not tree.contains_path("HNAVL/Nope/Concat")
+    assert tree.resolve_path("HNAVL/ListOps/Concat").child_tree is None
+    assert flatten(tree) == before
+
+    paths = [f"HNAVL/TreeOps/{op}" for op in ("Copy", "Merge", "Prune", "Missing")]
+    HNAVLib.tree.HNAVL.path_cache.clear()
+    errors = []
+    def _reader():
+        try:
+            for i in range(2000):
+                assert tree.contains_path(paths[i % 4]) == (i % 4 != 3)
+        except AssertionError as exc:
+            errors.append(exc)
+    readers = [threading.Thread(target=_reader) for _ in range(4)]
+    for r in readers:
+        r.start()
+    for r in readers:
+        r.join()
+    cache = HNAVLib.tree.HNAVL.path_cache
+    assert not errors
+    assert cache.hits + cache.misses == 8000
+
+@with_totals
+def test_insert_paths():
+    paths = rand_dup_paths(4000, seed=5)
+    expected, kept = insert_each(paths[:2000])
+    batch = []
+    for p in paths[2000:]:
+        try:
+            expected.insert_path(p)
+            batch.append(p)
+        except ValueError:
+            pass
+    tree = insert_each(kept)[0]
+    tree.insert_paths(batch)
+    assert flatten(tree) == flatten(expected)
+
+    before = flatten(tree)
+    try:
+        tree.insert_paths(["c/[0]/new", "a/[0]/new", "zz", "zz", "zz/x"])
+        assert False, "ambiguous batch accepted"
+    except ValueError:
+        pass
+    assert flatten(tree) == before
+
+    # the collector is left alone unless the caller asks, and always restored
+    tree.insert_paths(["gc/a"])
+    assert gc.isenabled()
+    tree.insert_paths(["gc/b"], pause_gc=True)
+    assert gc.isenabled()
+    try:
+        tree.insert_paths(["gc/[0]/c", "gc", "gc/d"], pause_gc=True)
+        assert False, "ambiguous batch accepted"
+    except ValueError:
+        pass
+    assert gc.isenabled()
+
+def test_merge_sorted():
+    rng = random.Random(9)
+    for n, k in ((0, 1), (0, 50), (500, 5), (500, 400), (300, 3000)):
+        base = [rng.choice("acegi") + str(rng.randrange(20)) for _ in range(n)]
+        run = sorted(rng.choice("abcdefghij") + str(rng.randrange(20)) for _ in range(k))
+        expected = HNAVLib.tree.HNAVL()
+        level = HNAVLib.tree.HNAVL()
+        for key in base:
+            expected.insert_at_level(key)
+            level.insert_at_level(key)
+        old = [level.select(i) for i in range(n)]
+        added = level.merge_sorted(run)
+        for key in run:
+            expected.insert_at_level(key)
+        assert check_level(level) == check_level(expected)
+        # existing duplicates stay ahead of the merged ones
+        order = {id(node): i for i, node in enumerate(level.select(i) for i in range(n + k))}
+        for key in set(run):
+            olds = [order[id(x)] for x in old if x.key == key]
+            news = [order[id(x)] for x in added if x.key == key]
+            assert not olds or max(olds) < min(news)
+    try:
+        HNAVLib.tree.HNAVL().merge_sorted(["b", "a"])
+        assert False, "unsorted run accepted"
+    except ValueError:
+        pass
+
+def test_iter_paths():
+    import io
+    tree = HNAVLib.tree.HNAVL()
+    HNAVLib.HNAVLdoc.populateintoHNAVL(tree)
+    expected = []
+    def _walk(level, prefix, depth):
+        for key, children in level:
+            expected.append((depth, f"{prefix}/{key}" if prefix else key))
+            _walk(children, f"{prefix}/{key}" if prefix else key, depth + 1)
+    _walk(flatten(tree), "", 0)
+    assert [(d, p) for d, p, node in tree.iter_paths()] == expected
+
+    lines = list(tree.iter_lines())
+    assert lines[0] == "└── HNAVL" and lines[1] == "    ├── HNAVL/ListOps"
+    assert lines[-1] == "        └── HNAVL/TreeOps/root"
+    sink = io.StringIO()
+    tree.print_tree(file=sink)
+    assert sink.getvalue() == "\n".join(lines) + "\n"
+
+    # far deeper than the recursion limit
+    deep = HNAVLib.tree.HNAVL()
+    deep.insert_path("/".join(["d"] * (sys.getrecursionlimit() + 500)))
+    depths = [d for d, p, node in deep.iter_paths()]
+    assert depths == list(range(sys.getrecursionlimit() + 500))
+
+def glob_match(segments, parts):
+    """Reference matcher for query: fnmatch per segment, `**` for any number of them."""
+    if not segments:
+        return not parts
+    if segments[0] == "**":
+        return glob_match(segments[1:], parts) or bool(parts) and glob_match(segments, parts[1:])
+    return bool(parts) and fnmatch.fnmatchcase(parts[0], segments[0]) and glob_match(segments[1:], parts[1:])
+
+def test_query():
+    doc = HNAVLib.tree.HNAVL()
+    HNAVLib.HNAVLdoc.populateintoHNAVL(doc)
+    dups, kept = insert_each(rand_dup_paths(800, seed=17))
+    cases = [(doc, p) for p in ("HNAVL/*/Delete*", "HNAVL/**/Insert*", "**/Search", "HNAVL/ListOps/**",
+                                "HNAVL/TreeOps/*Node", "**", "HNAVL/?????Ops/[DI]*", "nothing/**", "HNAVL/*/Get_*")]
+    cases += [(dups, p) for p in ("a", "a/*", "*/b", "**/c", "a/**/b", "**/a/**", "?/[ab]/*", "b*", "a/**/**/c", "**/**", "**/b", "**/a/b")]
+    for tree, pattern in cases:
+        expected = [(p, id(node)) for d, p, node in tree.iter_paths() if glob_match(pattern.split("/"), p.split("/"))]
+        found = [(p, id(node)) for p, node in tree.query(pattern)]
+        assert found == expected, pattern
+    assert [p for p, node in doc.query("HNAVL/*/Delete*")][:2] == ["HNAVL/ListOps/Delete", "HNAVL/ListOps/DeleteRange"]
+
+    second = dups.resolve_path("a/[1]")
+    expected = {id(n) for n in second.child_tree.iter_range("b", "b\0")}
+    assert expected and {id(node) for p, node in dups.query("a/[1]/b")} == expected
+    assert list(dups.query("a/[99]/b")) == []
+    # below a `**`, [n] still counts occurrences within each level
+    assert any(node is second for p, node in dups.query("**/a/[1]"))
+    assert not any(node is dups.resolve_path("a/[0]") for p, node in dups.query("**/a/[1]"))
+
+    walks = HNAVLib.tree.HNAVL.walk_count
+    next(doc.query("HNAVL/ListOps/Search"))  # lazy: equal_range + iter_ranks per level, nothing else
+    assert HNAVLib.tree.HNAVL.walk_count - walks == 6
+
+@with_totals
+def test_count_paths():
+    tree = HNAVLib.tree.HNAVL()
+    HNAVLib.HNAVLdoc.populateintoHNAVL(tree)
+    everything = [p for d, p, node in tree.iter_paths()]
+    assert tree.count_paths() == len(everything)
+    for path in ("HNAVL", "HNAVL/TreeOps", "HNAVL/ListOps/Search"):
+        assert tree.count_paths(path) == sum(p.startswith(path + "/") for p in everything)
+    assert tree.count_paths("HNAVL/NoSuchOps") == 0
+
+    tree.insert_path("HNAVL/TreeOps/Search/[0]/deep/er")
+    assert tree.count_paths("HNAVL/TreeOps/Search") == 2
+    tree.insert_paths(["HNAVL/TreeOps/Search/[0]/deep/[0]/est", "HNAVL/TreeOps/Search/[0]/wide"])
+    assert tree.count_paths("HNAVL/TreeOps/Search") == 4
+    before = tree.count_paths()
+    tree.delete_path("HNAVL/TreeOps/Search/[0]/deep")
+    assert tree.count_paths() == before - 3
+    flatten(tree)
+
+    buf = io.BytesIO()
+    HNAVLib.snapshot.write(tree, buf)
+    mapped = HNAVLib.snapshot.loads(buf.getvalue())
+    assert mapped.count_paths() == tree.count_paths() and not mapped.materialized
+
+    # per-level mutators keep the counts right on the root level and refuse nested ones
+    small = HNAVLib.tree.HNAVL()
+    for path in ("a/b", "a/c", "z"):
+        small.insert_path(path)
+    nested = small.resolve_path("a").child_tree
+    mutations = [lambda level: level.insert_at_level("d"), lambda level: level.merge_sorted(["e", "f"]),
+                 lambda level: level.delete_at_level("b"), lambda level: level.delete_rank(0)]
+    for mutate in mutations:
+        try:
+            mutate(nested)
+            assert False, "nested level changed behind the totals"
+        except ValueError:
+            pass
+        assert small.count_paths() == len(list(small.iter_paths()))
+        mutate(small)
+        assert small.count_paths() == len(list(small.iter_paths()))
+    assert small.rank_path("z") == small.count_paths() - 1
+    flatten(small)
+
+    # without track_totals the counts refuse to answer, but snapshots still carry them
+    HNAVLib.tree.HNAVL.track_totals = False
+    untracked = HNAVLib.tree.HNAVL()
+    HNAVLib.HNAVLdoc.populateintoHNAVL(untracked)
+    untracked.delete_path("HNAVL/TreeOps")
+    for call in (untracked.count_paths, lambda: untracked.select_path(0), lambda: untracked.rank_path("HNAVL")):
+        try:
+            call()
+            assert False, "stale totals used"
+        except ValueError:
+            pass
+    buf = io.BytesIO()
+    HNAVLib.snapshot.write(untracked, buf)
+    HNAVLib.tree.HNAVL.track_totals = True
+    mapped = HNAVLib.snapshot.loads(buf.getvalue())
+    assert mapped.count_paths() == len(list(untracked.iter_paths()))
+    flatten(mapped)
+
+@with_totals
+def test_select_path():
+    tree, kept = insert_each(rand_dup_paths(1500))
+    tree.insert_path("a/[0]/" + "/".join("deep" for _ in range(30)))
+    listing = list(tree.iter_paths())
+    assert len(listing) == tree.count_paths()
+    # Each node's path with an explicit [n] on every segment, for rank_path
+    explicit, parents, counters = [], [], []
+    for depth, full_path, node in listing:
+        del parents[depth:]
+        del counters[depth + 1:]
+        if len(counters) == depth:
+            counters.append({})
+        occurrence = counters[depth].get(node.key, 0)
+        counters[depth][node.key] = occurrence + 1
+        segment = f"{node.key}/[{occurrence}]"
+        parents.append(f"{parents[-1]}/{segment}" if parents else segment)
+        explicit.append(parents[-1])
+
+    for i, (depth, full_path, node) in enumerate(listing):
+        assert tree.select_path(i) == (full_path, node)
+        assert tree.rank_path(explicit[i]) == i
+    assert tree.select_path(len(listing)) is None and tree.select_path(-1) is None
+    assert tree.rank_path("a/[0]/nope") == -1 and tree.rank_path("zz") == -1
+
+    for start in (1, 7, len(listing) // 2, len(listing) - 1, len(listing)):
+        assert list(tree.iter_paths(start=start)) == listing[start:]
+
+    # Positions follow deletes: the removed subtree drops out of the order
+    i = tree.rank_path("b/[0]")
+    removed = tree.delete_path("b/[0]").total
+    assert tree.select_path(i - 1)[1] is listing[i - 1][2]
+    assert tree.select_path(i)[1] is listing[i + removed][2]
+    assert tree.count_paths() == len(listing) - removed
+
+def test_delete():
+    rng = random.Random(10)
+    level = HNAVLib.tree.HNAVL()
+    model = []
+    for step in range(3000):
+        if model and rng.random() < 0.45:
+            if rng.random() < 0.5:
+                i = rng.randrange(len(model))
+                assert level.delete_rank(i) is model.pop(i)
+            else:
+                key = rng.choice(model).key
+                dups = [n for n in model if n.key == key]
+                occurrence = rng.randrange(len(dups))
+                assert level.delete_at_level(key, occurrence) is dups[occurrence]
+                model.remove(dups[occurrence])
+        else:
+            node = level.insert_at_level(rng.choice("abcdef") + str(rng.randrange(9)))
+            model = sorted(model + [node], key=lambda n: n.key)  # stable: new dup goes last
+        if step % 100 == 0:
+            check_level(level)
+    assert [level.select(i) for i in range(len(model))] == model
+    assert level.delete_rank(len(model)) is None
+    assert level.delete_at_level("zz") is None
+
+@with_totals
+def test_delete_path():
+    tree = HNAVLib.tree.HNAVL()
+    for p in ("bar", "bar/foo", "bar/foo", "bar/foo/[0]/apple", "bar/foo/[1]/orange", "par"):
+        tree.insert_path(p)
+    orange_foo = tree.resolve_path("bar/foo/[1]")
+    try:
+        tree.delete_path("bar/foo/[1]", recursive=False)
+        assert False, "deleted a node with children"
+    except ValueError:
+        pass
+    assert tree.delete_path("bar/foo/[1]") is orange_foo
+    assert not tree.contains_path("bar/foo/[1]")
+    assert tree.resolve_path("bar/foo").child_tree.root.key == "apple"
+    assert tree.delete_path("bar/foo/apple").key == "apple"
+    assert tree.resolve_path("bar/foo").child_tree is None
+    assert tree.delete_path("bar/foo/apple") is None
+    tree.delete_path("bar/foo")
+    assert tree.resolve_path("bar").child_tree is None
+    assert [p for d, p, n in tree.iter_paths()] == ["bar", "par"]
+
+def test_snapshot():
+    import tempfile
+    tree, kept = insert_each(rand_dup_paths(2000, seed=21))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tree.snap")
+        tree.save(path)
+        for use_mmap in (True, False):
+            mapped = HNAVLib.tree.HNAVL.open(path, mmap=use_mmap)
+            for key in ("a", "b", "c", "d", ""):
+                for occurrence in (0, 1, 2, 7):
+                    got = mapped.equal_range(key, occurrence)
+                    want = tree.equal_range(key, occurrence)
+                    assert got[:2] == want[:2]
+                    assert [n and n.key for n in got[2:]] == [n and n.key for n in want[2:]]
+                assert mapped.get_rank(key) == tree.get_rank(key)
+            assert [mapped.select(i).key for i in range(tree.root.size)] == check_level(tree)
+            assert mapped.select(tree.root.size) is None
+            first = mapped.find_first("b")
+            assert first is mapped.select(mapped.get_rank("b"))
+            assert not mapped.materialized
+            assert mapped.resolve_path("a/[0]/b/[0]") is not None
+            assert flatten(mapped) == flatten(tree)
+            assert mapped.materialized and mapped.find_first("b") is first
+            mapped.insert_path("a/[0]/zz")
+            assert mapped.contains_path("a/[0]/zz")
+
+        empty = os.path.join(tmp, "empty.snap")
+        HNAVLib.tree.HNAVL().save(empty)
+        assert HNAVLib.tree.HNAVL.open(empty).root is None
+
+        # readers racing each other and a materializing traversal
+        mapped = HNAVLib.tree.HNAVL.open(path)
+        def _resolves(p):
+            try:
+                return tree.resolve_path(p) is not None
+            except ValueError:
+                return False
+        probes = [p for p in kept if _resolves(p)][:300]
+        want = [tree.resolve_path(p).key for p in probes]
+        found, errors = [], []
+        def _reader(seed):
+            try:
+                rng = random.Random(seed)
+                order = rng.sample(range(len(probes)), len(probes))
+                got = {i: mapped.resolve_path(probes[i]) for i in order}
+                assert [got[i].key for i in range(len(probes))] == want
+                found.append([got[i] for i in range(len(probes))])
+                if seed % 2:
+                    assert flatten(mapped) == flatten(tree)
+            except Exception as exc:
+                errors.append(exc)
+        readers = [threading.Thread(target=_reader, args=(s,)) for s in range(6)]
+        for r in readers:
+            r.start()
+        for r in readers:
+            r.join()
+        assert not errors and len(found) == 6
+        assert all(a is b for other in found[1:] for a, b in zip(found[0], other))
+        assert mapped.materialized
+
+def test_wal_recovery():
+    import tempfile
+    Durable = HNAVLib.wal.DurableHNAVL
+    with tempfile.TemporaryDirectory() as tmp:
+        snap, log = os.path.join(tmp, "tree.snap"), os.path.join(tmp, "tree.wal")
+        expected, kept = insert_each(rand_dup_paths(1500, seed=4))
+
+        db = Durable(snap, log, fsync="batch", group_size=64)
+        assert len(kept) > 300
+        for p in kept[:300]:
+            db.insert_path(p)
+        db.insert_path("zz")
+        db.insert_path("zz")
+        try:
+            db.insert_path("zz/ambiguous")
+        except ValueError:
+            pass
+        db.delete_path("zz")
+        db.delete_path("zz")
+        db.checkpoint()
+        db.insert_paths(kept[300:])
+        db.delete_path(kept[-1])
+        db.commit()
+        db.insert_path("lost/because/never/committed")
+        # no close(): simulate a crash
+
+        expected.delete_path(kept[-1])
+        db = Durable(snap, log)
+        assert db.recovery["records"] == len(kept) - 300 + 1
+        assert flatten(db.tree) == flatten(expected)
+
+        # a crash between writing the snapshot and resetting the log must not replay twice
+        HNAVLib.snapshot.save(db.tree, snap, db.wal.next_sequence)
+        db.close()
+        with open(log, "ab") as f:
+            f.write(b"\x05\x00\x00\x00torn")
+        db = Durable(snap, log, fsync="always")
+        assert db.recovery["records"] == 0
+        assert flatten(db.tree) == flatten(expected)
+        db.insert_path("after/torn/tail")
+        db.close()
+        db = Durable(snap, log)
+        assert db.tree.contains_path("after/torn/tail")
+        db.close()
+
+@with_totals
+def test_persistent_versions():
+    expected, kept = insert_each(rand_dup_paths(1500, seed=6))
+    store = HNAVLib.persistent.PersistentHNAVL()
+    versions = []
+    for i, p in enumerate(kept):
+        store.insert_path(p)
+        if i % 100 == 0:
+            versions.append((store.current, flatten(store.current)))
+    assert flatten(store.current) == flatten(expected)
+
+    before = store.current
+    store.insert_path("zz")
+    store.insert_path("zz")
+    try:
+        store.insert_paths(["zz/[0]/x", "zz/y"])
+        assert False, "ambiguous path accepted"
+    except ValueError:
+        pass
+    assert store.current.resolve_path("zz/[0]/x") is None  # batches publish all or nothing
+
+    # one more insert shares everything but O(log n) nodes per level on its path
+    old_ids = {id(node) for depth, path, node in store.current.iter_paths()}
+    new_version = store.insert_path("a/[0]/b/[0]/new")
+    copied = [node for depth, path, node in new_version.iter_paths() if id(node) not in old_ids]
+    assert 0 < len(copied) <= 40
+    store.delete_path("zz")
+    store.delete_path("zz")
+    store.delete_path("a/[0]/b/[0]/new")
+    assert flatten(store.current) == flatten(before)
+
+    for p in kept[::5]:
+        try:
+            removed = expected.delete_path(p)
+        except ValueError:
+            removed = "ambiguous"
+        try:
+            version = store.delete_path(p)
+        except ValueError:
+            version = "ambiguous"
+        assert (version == "ambiguous") == (removed == "ambiguous")
+    assert store.delete_path("no/such/path") is store.current
+    assert flatten(store.current) == flatten(expected)
+    # every older version still reads exactly as when it was published
+    assert all(flatten(version) == view for version, view in versions)
+
+@with_totals
+def test_concurrent_stress():
+    writers = 4
+    batches = [insert_each([f"w{t}/{p}" for p in rand_dup_paths(400, seed=20 + t)])[1] for t in range(writers)]
+    expected, _ = insert_each([p for batch in batches for p in batch])
+    shared = HNAVLib.locking.ConcurrentHNAVL()
+    errors = []
+    done = threading.Event()
+
+    def write(batch):
+        try:
+            shared.insert_paths(batch)
+        except Exception as e:
+            errors.append(e)
+
+    def read(seed):
+        rng = random.Random(seed)
+        probes = [p for batch in batches for p in batch]
+        while not done.is_set():
+            p = rng.choice(probes)
+            try:
+                node = shared.resolve_path(p)
+            except ValueError:
+                continue  # ambiguous once later duplicates arrive
+            if node is not None and node.key != HNAVLib.tree.HNAVL._parse_path(p)[-1][0]:
+                errors.append(AssertionError(f"{p} resolved to {node.key}"))
+
+    readers = [threading.Thread(target=read, args=(s,)) for s in range(3)]
+    threads = [threading.Thread(target=write, args=(b,)) for b in batches]
+    for th in readers + threads:
+        th.start()
+    for th in threads:
+        th.join()
+    done.set()
+    for th in readers:
+        th.join()
+    assert not errors, errors
+    assert flatten(shared.tree) == flatten(expected)
+
+    # concurrent deletes of whole subtrees drop their locks with them
+    deleters = [threading.Thread(target=shared.delete_path, args=(f"w{t}",)) for t in range(writers)]
+    for th in deleters:
+        th.start()
+    for th in deleters:
+        th.join()
+    assert shared.tree.root is None
+    gc.collect()
+    assert set(shared._locks.keys()) <= {shared.tree}
+
+    # writers below different members of one long run of duplicate siblings
+    siblings = 2000
+    shared.insert_paths(["a"] * siblings)
+    def write_under(t):
+        try:
+            shared.insert_paths([f"a/[{k}]/x/{j}" for k in range(t, siblings, writers) for j in range(2)])
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=write_under, args=(t,)) for t in range(writers)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    assert not errors, errors
+    flatten(shared.tree)
+    assert shared.tree.count_paths() == siblings * 4
+    assert shared.tree.count_paths(f"a/[{siblings - 1}]") == 3
+
 def add_comb_list():
     # HNAdoc.insert_path("HNAVL/TreeOps/Some_op/impl_comb/[0]/space separated list of ops that can be combined to create Some_op")
     pass
@@ -26,3 +26,7 @@
 
 from . import tree
 from . import HNAVLdoc
+from . import snapshot
+from . import wal
+from . import persistent
+from . import locking
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# coding=utf-8
+# Copyright (C) 2026 Roy Pfund. All rights reserved.
+#
+# Permission is  hereby  granted,  free  of  charge,  to  any  person
+# obtaining a copy of  this  software  and  associated  documentation
+# files  (the  "Software"),  to  deal   in   the   Software   without
+# restriction, including without limitation the rights to use,  copy,
+# modify, merge, publish, distribute, sublicense, and/or sell  copies
+# of the Software, and to permit persons  to  whom  the  Software  is
+# furnished to do so.
+#
+# The above copyright notice and  this  permission  notice  shall  be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT  WARRANTY  OF  ANY  KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES  OF
+# MERCHANTABILITY,   FITNESS   FOR   A   PARTICULAR    PURPOSE    AND
+# NONINFRINGEMENT.  IN  NO  EVENT  SHALL  THE  AUTHORS  OR  COPYRIGHT
+# OWNER(S) BE LIABLE FOR  ANY  CLAIM,  DAMAGES  OR  OTHER  LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING  FROM,
+# OUT OF OR IN CONNECTION WITH THE  SOFTWARE  OR  THE  USE  OR  OTHER
+# DEALINGS IN THE SOFTWARE.
+######################################################################
+
+# locking.py
+
+import threading, weakref
+
+from . import tree
+
+"""
+
+# Thread-safe HNAVL with one reader-writer lock per level
+
+Every operation walks down the hierarchy taking one lock per level,
+always top-down, so the walks cannot deadlock. Readers go hand over
+hand: they take the next level's lock before letting go of the previous
+one. Writers keep every level they pass locked until they are done, as
+readers unless they change it. Holding a level's parent keeps the level
+attached while its lock is upgraded or it is written. Operations in
+disjoint subtrees therefore only meet at the levels they share, and only
+as readers.
+
+Node.total is why writers hold on: with track_totals on, every insert or
+delete changes it on the nodes above, in every ancestor level. A level
+that is still read-locked cannot be restructured, so the nodes a writer
+passed on the way down are still the ones above its change, and it adds
+to their totals directly. Only those additions go through one short
+`totals` mutex, since writers in disjoint subtrees share their ancestors.
+
+"""
+
+class RWLock:
+    """
+    Many readers or one writer. Writer-preferring: once a writer waits,
+    new readers queue behind it, so a stream of lookups cannot starve the
+    ingester. Not reentrant.
+    """
+    __slots__ = ("_mutex", "_cond", "_readers", "_writer", "_waiting_writers")
+
+    def __init__(self):
+        # The uncontended paths use the bare mutex; only waiting goes
+        # through the Condition (which is slower to enter).
+        self._mutex = threading.Lock()
+        self._cond = threading.Condition(self._mutex)
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        with self._mutex:
+            if not (self._writer or self._waiting_writers):
+                self._readers += 1
+                return
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._mutex:
+            self._readers -= 1
+            if not self._readers and self._waiting_writers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._mutex:
+            if not (self._writer or self._readers):
+                self._writer = True
+                return
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._mutex:
+            self._writer = False
+            self._cond.notify_all()
+
+class ConcurrentHNAVL:
+    """
+    Wraps an in-memory HNAVL hierarchy for use from many threads.
+
+    resolve_path/contains_path take read locks all the way down.
+    insert_path reads its way down and upgrades to a write lock only on
+    the levels it changes. That is the last one, plus any level where an
+    intermediate node or its child_tree has to be created. delete_path
+    writes the target's level and the level above it, which may have to
+    release an emptied child_tree.
+    Same rules and results as the HNAVL methods of the same names. Once
+    wrapped, the hierarchy must only be changed through the wrapper.
+    Returned Nodes are not locked: read their fields before a concurrent
+    writer can change them, or use PersistentHNAVL for stable views.
+    """
+    def __init__(self, hnavl: tree.HNAVL = None):
+        self.tree = hnavl if hnavl is not None else tree.HNAVL()
+        if self.tree.intern_keys:
+            self.tree._symbol_table()
+        # level -> RWLock; an entry goes away with its level, however that is dropped
+        self._locks = weakref.WeakKeyDictionary()
+        # Serializes the additions to the totals of shared ancestors
+        self._totals = threading.Lock()
+
+    def _lock_for(self, level: tree.HNAVL) -> RWLock:
+        lock = self._locks.get(level)
+        if lock is None:
+            lock = self._locks.setdefault(level, RWLock())
+        return lock
+
+    def _acquire(self, level: tree.HNAVL, write: bool) -> tuple:
+        lock = self._lock_for(level)
+        if write:
+            lock.acquire_write()
+        else:
+            lock.acquire_read()
+        return lock, write
+
+    @staticmethod
+    def _release(held: tuple):
+        lock, write = held
+        if write:
+            lock.release_write()
+        else:
+            lock.release_read()
+
+    def _steps(self, path: str, adding: bool) -> tuple:
+        """
+        The parsed path, with its segments swapped for their symbols:
+        interned when adding, only looked up otherwise, so reads
+        never grow the table.
+        """
+        steps = self.tree.path_cache.get(path)
+        if self.tree.intern_keys:
+            symbol = self.tree.symbols.intern if adding else self.tree.symbols.lookup
+            steps = tuple((symbol(segment), target_index, explicit) for segment, target_index, explicit in steps)
+        return steps
+
+    def insert_path(self, path: str):
+        steps = self._steps(path, True)
+        last = len(steps) - 1
+        level = self.tree
+        # Nodes passed on the way down; their levels stay locked until the end
+        spine = [] if level.track_totals else None
+        held = [self._acquire(level, last == 0)]
+        try:
+            i = 0
+            while i < last:
+                segment, target_index, explicit_index = steps[i]
+                mark = len(spine) if spine is not None else 0
+                first_rank, count, first_node, target_node = level.equal_range(segment, target_index, spine)
+                if count > 1 and not explicit_index:
+                    raise ValueError(f"Ambiguous path: multiple occurrences of '{segment}' at this level. Specify [n] to choose.")
+                if not (target_node and target_node.child_tree) and not held[-1][1]:
+                    # Upgrade, then look again: another writer may have
+                    # created the node meanwhile. The parent's lock, still
+                    # held, keeps this level attached.
+                    if spine is not None:
+                        del spine[mark:]
+                    self._release(held.pop())
+                    held.append(self._acquire(level, True))
+                    continue
+                if not target_node:
+                    if spine is not None:
+                        del spine[mark:]
+                    break
+                if not target_node.child_tree:
+                    target_node.child_tree = tree.HNAVL(nested=True)
+                level = target_node.child_tree
+                held.append(self._acquire(level, i + 1 == last))
+                i += 1
+
+            # Every step from i on creates a node; they form a simple chain,
+            # linked into the write-locked level with a single insertion.
+            node = None
+            for segment, target_index, explicit_index in reversed(steps[i:]):
+                parent = tree.Node(segment)
+                if node:
+                    parent.child_tree = tree.HNAVL(nested=True)
+                    parent.child_tree.root = node
+                    parent.total += node.total
+                node = parent
+            level._insert_node(node)
+            if spine is not None:
+                with self._totals:
+                    for ancestor in spine:
+                        ancestor.total += len(steps) - i
+        finally:
+            for h in reversed(held):
+                self._release(h)
+
+    def insert_paths(self, paths):
+        """insert_path for each path in order; not atomic as a batch."""
+        for path in paths:
+            self.insert_path(path)
+
+    def resolve_path(self, path: str) -> tree.Node:
+        steps = self._steps(path, False)
+        last = len(steps) - 1
+        level = self.tree
+        held = [self._acquire(level, False)]
+        try:
+            for i, (segment, target_index, explicit_index) in enumerate(steps):
+                first_rank, count, first_node, target_node = level.equal_range(segment, target_index)
+                if i < last and count > 1 and not explicit_index:
+                    raise ValueError(f"Ambiguous path: multiple occurrences of '{segment}' at this level. Specify [n] to choose.")
+                if not target_node or i == last:
+                    return target_node
+                level = target_node.child_tree
+                if not level:
+                    return None
+                held.append(self._acquire(level, False))
+                self._release(held.pop(0))
+            return None
+        finally:
+            for h in reversed(held):
+                self._release(h)
+
+    def contains_path(self, path: str) -> bool:
+        return self.resolve_path(path) is not None
+
+    def delete_path(self, path: str, recursive: bool = True) -> tree.Node:
+        steps = self._steps(path, False)
+        last = len(steps) - 1
+        level = self.tree
+        parent_node = None
+        # Nodes passed on the way down; their levels stay locked until the end
+        spine = [] if level.track_totals else None
+        held = [self._acquire(level, last <= 1)]
+        try:
+            for i, (segment, target_index, explicit_index) in enumerate(steps):
+                first_rank, count, first_node, target_node = level.equal_range(segment, target_index, spine if i < last else None)
+                if i < last and count > 1 and not explicit_index:
+                    raise ValueError(f"Ambiguous path: multiple occurrences of '{segment}' at this level. Specify [n] to choose.")
+                if not target_node:
+                    return None
+                if i == last:
+                    break
+                if not target_node.child_tree:
+                    return None
+                parent_node = target_node
+                level = target_node.child_tree
+                held.append(self._acquire(level, i + 2 >= last))
+
+            if not recursive and target_node.child_tree and target_node.child_tree.root:
+                raise ValueError(f"'{path}' has children; pass recursive=True to delete them too.")
+            removed = level._delete_rank(first_rank + target_index)
+            if parent_node and not level.root:
+                parent_node.child_tree = None
+            if spine is not None:
+                with self._totals:
+                    for ancestor in spine:
+                        ancestor.total -= removed.total
+            return removed
+        finally:
+            for h in reversed(held):
+                self._release(h)
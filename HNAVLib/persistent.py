@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# coding=utf-8
+# Copyright (C) 2026 Roy Pfund. All rights reserved.
+#
+# Permission is  hereby  granted,  free  of  charge,  to  any  person
+# obtaining a copy of  this  software  and  associated  documentation
+# files  (the  "Software"),  to  deal   in   the   Software   without
+# restriction, including without limitation the rights to use,  copy,
+# modify, merge, publish, distribute, sublicense, and/or sell  copies
+# of the Software, and to permit persons  to  whom  the  Software  is
+# furnished to do so.
+#
+# The above copyright notice and  this  permission  notice  shall  be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT  WARRANTY  OF  ANY  KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES  OF
+# MERCHANTABILITY,   FITNESS   FOR   A   PARTICULAR    PURPOSE    AND
+# NONINFRINGEMENT.  IN  NO  EVENT  SHALL  THE  AUTHORS  OR  COPYRIGHT
+# OWNER(S) BE LIABLE FOR  ANY  CLAIM,  DAMAGES  OR  OTHER  LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING  FROM,
+# OUT OF OR IN CONNECTION WITH THE  SOFTWARE  OR  THE  USE  OR  OTHER
+# DEALINGS IN THE SOFTWARE.
+######################################################################
+
+# persistent.py
+
+import threading
+
+from . import tree
+
+"""
+
+# Copy-on-write (path-copying) HNAVL versions
+
+A mutation never changes a Node reachable from an existing version. In the
+level it edits, it copies the nodes on the root-to-target path, plus any
+sibling a rotation has to move. In every level above, it copies the path
+down to the node whose child_tree now points at the new level. Everything
+else is shared with the previous version.
+
+"""
+
+def _copy(node: tree.Node) -> tree.Node:
+    copy = tree.Node(node.key)
+    copy.left = node.left
+    copy.right = node.right
+    copy.height = node.height
+    copy.size = node.size
+    copy.total = node.total
+    copy.child_tree = node.child_tree
+    return copy
+
+def _copy_spine(spine: list, fresh: set) -> list:
+    """
+    Copies a root-to-node path (each node a child of the one before),
+    links the copies together and returns them in the same order.
+    """
+    copies = []
+    for node in spine:
+        copy = _copy(node)
+        if copies:
+            parent = copies[-1]
+            if parent.left is node:
+                parent.left = copy
+            else:
+                parent.right = copy
+        copies.append(copy)
+        fresh.add(copy)
+    return copies
+
+def _rank_spine(root: tree.Node, index: int) -> list:
+    """The path from root to the node at a 0-based index."""
+    spine = []
+    curr = root
+    while curr:
+        spine.append(curr)
+        left_size = curr.left.size if curr.left else 0
+        if index == left_size:
+            break
+        elif index < left_size:
+            curr = curr.left
+        else:
+            index -= (left_size + 1)
+            curr = curr.right
+    return spine
+
+def _level(root: tree.Node, nested: bool = False) -> tree.HNAVL:
+    level = tree.HNAVL(nested)
+    level.root = root
+    return level
+
+class _Draft(tree.HNAVL):
+    """
+    A level whose root-to-target path has already been copied, so the
+    ordinary in-place algorithms can run on it. The rotations also copy
+    any node that was not copied yet before they change it. That covers
+    the siblings a deletion rebalances through.
+    """
+    __slots__ = ("fresh",)
+
+    def __init__(self, root: tree.Node, fresh: set):
+        super().__init__()
+        self.root = root
+        self.fresh = fresh
+
+    def _own(self, node: tree.Node) -> tree.Node:
+        if node in self.fresh:
+            return node
+        copy = _copy(node)
+        self.fresh.add(copy)
+        return copy
+
+    def _rotate_left(self, x: tree.Node) -> tree.Node:
+        x = self._own(x)
+        x.right = self._own(x.right)
+        return super()._rotate_left(x)
+
+    def _rotate_right(self, y: tree.Node) -> tree.Node:
+        y = self._own(y)
+        y.left = self._own(y.left)
+        return super()._rotate_right(y)
+
+def inserted(level: tree.HNAVL, node: tree.Node) -> tree.HNAVL:
+    """A new version of level with node inserted (after any equal keys)."""
+    spine = []
+    curr = level.root if level else None
+    while curr:
+        spine.append(curr)
+        curr = curr.left if node.key < curr.key else curr.right
+    fresh = set()
+    copies = _copy_spine(spine, fresh)
+    draft = _Draft(copies[0] if copies else None, fresh)
+    draft._insert_node(node)
+    return _level(draft.root)
+
+def deleted(level: tree.HNAVL, index: int) -> tuple:
+    """(new version of level, removed node) for the node at index."""
+    spine = _rank_spine(level.root, index)
+    target = spine[-1]
+    if target.left and target.right:
+        # delete_rank relinks the successor, so its path is copied too
+        succ = target.right
+        while succ:
+            spine.append(succ)
+            succ = succ.left
+    fresh = set()
+    draft = _Draft(_copy_spine(spine, fresh)[0], fresh)
+    removed = draft._delete_rank(index)
+    return _level(draft.root), removed
+
+def replaced(level: tree.HNAVL, index: int, child_tree: tree.HNAVL) -> tree.HNAVL:
+    """A new version of level whose node at index has another child_tree."""
+    copies = _copy_spine(_rank_spine(level.root, index), set())
+    if child_tree is not None:
+        child_tree.nested = True
+    copies[-1].child_tree = child_tree
+    for copy in reversed(copies):
+        level._update_metadata(copy)
+    return _level(copies[0])
+
+class PersistentHNAVL:
+    """
+    An HNAVL hierarchy kept as a series of immutable versions.
+
+    `current` is the latest version, an ordinary HNAVL root. Readers take
+    it once and can run any read-only method on it (resolve_path,
+    equal_range, iter_paths, ...) for as long as they like. Later writes
+    never change it, and it is freed once nobody holds it any more.
+    insert_path, insert_paths and delete_path follow the same rules as the
+    HNAVL methods of the same name, but build a new version by path
+    copying: O(log n) new nodes per level on the path. Each publishes the
+    new version with a single reference assignment and returns it.
+    Writers are serialized by a lock; readers never wait.
+    Versions must be treated as read-only: calling a mutating HNAVL method
+    on one directly would change nodes that other versions share.
+    """
+    def __init__(self, base: tree.HNAVL = None):
+        # base (if given) becomes the first version and must not be mutated afterwards
+        self.current = base if base is not None else tree.HNAVL()
+        if self.current.intern_keys:
+            self.current._symbol_table()
+        self._lock = threading.Lock()
+
+    def _steps(self, version: tree.HNAVL, path: str, adding: bool) -> tuple:
+        """
+        The parsed path, with its segments swapped for their symbols:
+        interned when adding, only looked up otherwise.
+        """
+        steps = version.path_cache.get(path)
+        if version.intern_keys:
+            symbol = version.symbols.intern if adding else version.symbols.lookup
+            steps = tuple((symbol(segment), target_index, explicit) for segment, target_index, explicit in steps)
+        return steps
+
+    def _resolve(self, version: tree.HNAVL, steps: tuple) -> tuple:
+        """
+        Walks the intermediate steps like insert_path. Returns (chain, level,
+        i): chain holds (level, rank) for each existing node passed on the
+        way, level is the level step i has to be applied to (None if it does
+        not exist yet), and i is the first step without an existing node.
+        """
+        chain = []
+        level = version
+        last = len(steps) - 1
+        for i, (segment, target_index, explicit_index) in enumerate(steps):
+            if i == last or level is None:
+                return chain, level, i
+            first_rank, count, first_node, target_node = level.equal_range(segment, target_index)
+            if count > 1 and not explicit_index:
+                raise ValueError(f"Ambiguous path: multiple occurrences of '{segment}' at this level. Specify [n] to choose.")
+            if not target_node:
+                return chain, level, i
+            chain.append((level, first_rank + target_index))
+            level = target_node.child_tree
+        return chain, level, last
+
+    def _publish(self, version: tree.HNAVL, chain: list, level: tree.HNAVL) -> tree.HNAVL:
+        """Rebuilds the ancestor levels above a new level, bottom-up."""
+        for parent, rank in reversed(chain):
+            level = replaced(parent, rank, level)
+        if level is None:
+            level = tree.HNAVL()
+        level.symbols = version.symbols
+        return level
+
+    def _insert(self, version: tree.HNAVL, path: str) -> tree.HNAVL:
+        steps = self._steps(version, path, True)
+        tree.HNAVL.segment_count += len(steps)
+        chain, level, i = self._resolve(version, steps)
+        # Every step from i on creates a node; they form a simple chain.
+        node = None
+        for segment, target_index, explicit_index in reversed(steps[i:]):
+            parent = tree.Node(segment)
+            if node:
+                parent.child_tree = _level(node, True)
+                parent.total += node.total
+            node = parent
+        return self._publish(version, chain, inserted(level, node))
+
+    def insert_path(self, path: str) -> tree.HNAVL:
+        with self._lock:
+            self.current = self._insert(self.current, path)
+            return self.current
+
+    def insert_paths(self, paths) -> tree.HNAVL:
+        """
+        Applies a batch in order and publishes only the final version, so
+        readers see all of it or none of it (also when a path is rejected).
+        """
+        with self._lock:
+            version = self.current
+            for path in paths:
+                version = self._insert(version, path)
+            self.current = version
+            return version
+
+    def delete_path(self, path: str, recursive: bool = True) -> tree.HNAVL:
+        """
+        Publishes a version without the node the path names, and returns
+        it. If the path does not exist, nothing changes and the current
+        version is returned.
+        """
+        with self._lock:
+            version = self.current
+            steps = self._steps(version, path, False)
+            chain, level, i = self._resolve(version, steps)
+            if i != len(steps) - 1 or level is None:
+                return version
+            segment, target_index, explicit_index = steps[-1]
+            first_rank, count, first_node, target_node = level.equal_range(segment, target_index)
+            if not target_node:
+                return version
+            if not recursive and target_node.child_tree and target_node.child_tree.root:
+                raise ValueError(f"'{path}' has children; pass recursive=True to delete them too.")
+            level, removed = deleted(level, first_rank + target_index)
+            if chain and not level.root:
+                level = None
+            self.current = self._publish(version, chain, level)
+            return self.current
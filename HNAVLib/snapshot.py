@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+# coding=utf-8
+# Copyright (C) 2026 Roy Pfund. All rights reserved.
+#
+# Permission is  hereby  granted,  free  of  charge,  to  any  person
+# obtaining a copy of  this  software  and  associated  documentation
+# files  (the  "Software"),  to  deal   in   the   Software   without
+# restriction, including without limitation the rights to use,  copy,
+# modify, merge, publish, distribute, sublicense, and/or sell  copies
+# of the Software, and to permit persons  to  whom  the  Software  is
+# furnished to do so.
+#
+# The above copyright notice and  this  permission  notice  shall  be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT  WARRANTY  OF  ANY  KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES  OF
+# MERCHANTABILITY,   FITNESS   FOR   A   PARTICULAR    PURPOSE    AND
+# NONINFRINGEMENT.  IN  NO  EVENT  SHALL  THE  AUTHORS  OR  COPYRIGHT
+# OWNER(S) BE LIABLE FOR  ANY  CLAIM,  DAMAGES  OR  OTHER  LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING  FROM,
+# OUT OF OR IN CONNECTION WITH THE  SOFTWARE  OR  THE  USE  OR  OTHER
+# DEALINGS IN THE SOFTWARE.
+######################################################################
+
+# snapshot.py
+
+import os, struct, tempfile
+import mmap as _mmap
+
+from . import tree
+
+"""
+
+# On-disk snapshot of an HNAVL hierarchy
+
+All integers are little-endian.
+
+    header   magic "HNAVLSNP", u32 version, u32 string count,
+             u64 sequence, u64 string table offset, u64 root level offset
+    strings  every distinct key once: u32 byte length + UTF-8 bytes
+    levels   one per HNAVL level: u32 node count, u32 padding, then the
+             nodes in pre-order as fixed-size records of
+             (u64 key offset, i32 left, i32 right, u32 height, u32 size,
+              u64 total, u64 child level offset)
+
+left/right are record indices within the same level (-1 for none), so the
+root is record 0; key and child offsets are absolute file offsets (a child
+offset of 0 means no child_tree). The sequence is the number of write-ahead
+log records already folded into the snapshot (see HNAVLib.wal), 0 if unused.
+
+"""
+
+MAGIC = b"HNAVLSNP"
+VERSION = 2  # 2 added Node.total
+HEADER = struct.Struct("<8sIIQQQ")
+LEVEL = struct.Struct("<II")
+RECORD = struct.Struct("<QiiIIQQ")
+STRLEN = struct.Struct("<I")
+
+def save(hnavl: tree.HNAVL, path: str, sequence: int = 0):
+    """Writes a snapshot of the hierarchy to `path`, atomically replacing it."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".hnavl-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(hnavl, f, sequence)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def write(hnavl: tree.HNAVL, f, sequence: int = 0):
+    """Writes a snapshot to a binary file object (see the format above)."""
+    # Pass 1: list every level breadth-first and intern the keys, so all
+    # offsets are known before anything is written.
+    strings = {}
+    levels = [hnavl] if hnavl.root else []
+    for level in levels:
+        for node in _preorder(level.root):
+            if not isinstance(node.key, str):
+                raise TypeError(f"snapshot keys must be str, not {type(node.key).__name__}")
+            strings.setdefault(node.key, None)
+            if node.child_tree and node.child_tree.root:
+                levels.append(node.child_tree)
+
+    offset = HEADER.size
+    for key in strings:
+        strings[key] = offset
+        offset += STRLEN.size + len(key.encode("utf-8"))
+    level_offsets = {}
+    for level in levels:
+        level_offsets[id(level)] = offset
+        offset += LEVEL.size + RECORD.size * level.root.size
+
+    # Without track_totals the nodes' own totals are stale; count them here,
+    # deepest levels first, so the snapshot is right either way.
+    totals = None if hnavl.track_totals else _totals(levels)
+
+    if not levels:
+        # An empty hierarchy still gets an (empty) root level.
+        level_offsets[id(hnavl)] = offset
+    f.write(HEADER.pack(MAGIC, VERSION, len(strings), sequence, HEADER.size, level_offsets[id(hnavl)]))
+    for key in strings:
+        data = key.encode("utf-8")
+        f.write(STRLEN.pack(len(data)))
+        f.write(data)
+    if not levels:
+        f.write(LEVEL.pack(0, 0))
+
+    # Pass 2: one buffer per level, records in pre-order.
+    for level in levels:
+        count = level.root.size
+        buf = bytearray(LEVEL.size + RECORD.size * count)
+        LEVEL.pack_into(buf, 0, count, 0)
+        pos = LEVEL.size
+        for i, node in enumerate(_preorder(level.root)):
+            left = i + 1 if node.left else -1
+            right = i + 1 + (node.left.size if node.left else 0) if node.right else -1
+            child = node.child_tree
+            child_offset = level_offsets[id(child)] if child and child.root else 0
+            RECORD.pack_into(buf, pos, strings[node.key], left, right, node.height, node.size, totals[id(node)] if totals is not None else node.total, child_offset)
+            pos += RECORD.size
+        f.write(buf)
+
+def _totals(levels: list) -> dict:
+    """id(node) -> nested subtree total, for levels listed breadth-first."""
+    totals = {}
+    for level in reversed(levels):
+        stack = [(level.root, False)]
+        while stack:
+            node, done = stack.pop()
+            if done:
+                child = node.child_tree
+                totals[id(node)] = (1 + (totals[id(node.left)] if node.left else 0) + (totals[id(node.right)] if node.right else 0)
+                                    + (totals[id(child.root)] if child and child.root else 0))
+                continue
+            stack.append((node, True))
+            if node.right:
+                stack.append((node.right, False))
+            if node.left:
+                stack.append((node.left, False))
+    return totals
+
+def _preorder(node):
+    stack = [node] if node else []
+    while stack:
+        node = stack.pop()
+        yield node
+        if node.right:
+            stack.append(node.right)
+        if node.left:
+            stack.append(node.left)
+
+def load(path: str, use_mmap: bool = True) -> tree.HNAVL:
+    """
+    Opens a snapshot. Only the header is read up front: levels are read
+    from the mapped file (or from the file's bytes when use_mmap is False)
+    on first use, see MappedLevel.
+    """
+    with open(path, "rb") as f:
+        if use_mmap:
+            buf = _mmap.mmap(f.fileno(), 0, access=_mmap.ACCESS_READ)
+        else:
+            buf = f.read()
+    return loads(buf)
+
+def loads(buf) -> tree.HNAVL:
+    """Opens a snapshot held in any buffer (bytes, bytearray, mmap)."""
+    return MappedLevel(Snapshot(buf), _header(buf)[5])
+
+def read_sequence(path: str) -> int:
+    """The log sequence number recorded in a snapshot's header."""
+    with open(path, "rb") as f:
+        return _header(f.read(HEADER.size))[3]
+
+def _header(buf) -> tuple:
+    if len(buf) < HEADER.size:
+        raise ValueError("not an HNAVL snapshot: file too short")
+    header = HEADER.unpack_from(buf, 0)
+    if header[0] != MAGIC:
+        raise ValueError("not an HNAVL snapshot: bad magic")
+    if header[1] != VERSION:
+        raise ValueError(f"unsupported HNAVL snapshot version {header[1]}")
+    return header
+
+class Snapshot:
+    """An opened snapshot buffer plus a cache of its decoded keys."""
+    __slots__ = ("buf", "keys")
+
+    def __init__(self, buf):
+        self.buf = buf
+        self.keys = {}
+
+    def key_at(self, offset: int) -> str:
+        key = self.keys.get(offset)
+        if key is None:
+            (length,) = STRLEN.unpack_from(self.buf, offset)
+            start = offset + STRLEN.size
+            # setdefault so that racing readers all get the same string
+            key = self.keys.setdefault(offset, str(self.buf[start:start + length], "utf-8"))
+        return key
+
+_root_slot = tree.HNAVL.root
+
+class MappedLevel(tree.HNAVL):
+    """
+    An HNAVL level still living in a snapshot buffer.
+
+    The read-only primitives (select, get_rank, find_first, equal_range,
+    count_key, count_range) run directly against the buffer and only create the Nodes
+    they return. Those are cached, so each record becomes at most one Node,
+    and their child_tree is again a MappedLevel. A returned Node's left and
+    right are not linked until the level is materialized.
+    The first access to `root` (any mutation, traversal or print) turns the
+    whole level into ordinary Nodes, reusing the cached ones, after which
+    it behaves exactly like an in-memory HNAVL level.
+    Concurrent readers are safe: the caches are only filled through
+    setdefault, and materializing links the Nodes and publishes the root
+    before flipping the level over, so readers still walking the buffer
+    are unaffected. The buffer and the cache are only released by the
+    first write, which by the usual rule has no readers beside it.
+    """
+    __slots__ = ("_snapshot", "_offset", "_count", "_nodes", "_linked")
+
+    def __init__(self, snapshot: Snapshot, offset: int, nested: bool = False):
+        _root_slot.__set__(self, None)
+        self.symbols = None
+        self.nested = nested
+        self._snapshot = snapshot
+        self._offset = offset + LEVEL.size
+        self._count = LEVEL.unpack_from(snapshot.buf, offset)[0]
+        self._nodes = {}
+        self._linked = False
+
+    @property
+    def root(self):
+        if not self._linked:
+            self._materialize()
+        return _root_slot.__get__(self)
+
+    @root.setter
+    def root(self, value):
+        if not self._linked:
+            self._materialize()
+        self._snapshot = None
+        self._nodes = None
+        _root_slot.__set__(self, value)
+
+    @property
+    def materialized(self) -> bool:
+        return self._linked
+
+    def _record(self, i: int) -> tuple:
+        return RECORD.unpack_from(self._snapshot.buf, self._offset + i * RECORD.size)
+
+    def _size_at(self, i: int) -> int:
+        return RECORD.unpack_from(self._snapshot.buf, self._offset + i * RECORD.size)[4] if i >= 0 else 0
+
+    def _node(self, i: int, rec: tuple = None) -> tree.Node:
+        node = self._nodes.get(i)
+        if node is None:
+            key_offset, left, right, height, size, total, child_offset = rec or self._record(i)
+            node = tree.Node(self._snapshot.key_at(key_offset))
+            node.height = height
+            node.size = size
+            node.total = total
+            if child_offset:
+                node.child_tree = MappedLevel(self._snapshot, child_offset, True)
+            node = self._nodes.setdefault(i, node)
+        return node
+
+    def _materialize(self):
+        nodes = [self._node(i) for i in range(self._count)]
+        for i, node in enumerate(nodes):
+            key_offset, left, right, height, size, total, child_offset = self._record(i)
+            node.left = nodes[left] if left >= 0 else None
+            node.right = nodes[right] if right >= 0 else None
+        _root_slot.__set__(self, nodes[0] if nodes else None)
+        self._linked = True
+
+    def select(self, index: int) -> tree.Node:
+        if self._linked:
+            return super().select(index)
+        tree.HNAVL.walk_count += 1
+        i = 0 if self._count else -1
+        while i >= 0:
+            rec = self._record(i)
+            left_size = self._size_at(rec[1])
+            if index == left_size:
+                return self._node(i, rec)
+            elif index < left_size:
+                i = rec[1]
+            else:
+                index -= (left_size + 1)
+                i = rec[2]
+        return None
+
+    def get_rank(self, key: str) -> int:
+        if self._linked:
+            return super().get_rank(key)
+        return self.equal_range(key)[0]
+
+    def find_first(self, key: str) -> tree.Node:
+        if self._linked:
+            return super().find_first(key)
+        return self.equal_range(key)[2]
+
+    def _total(self) -> int:
+        if self._linked:
+            return super()._total()
+        return self._record(0)[5] if self._count else 0
+
+    def _get_lower_bound(self, key: str) -> int:
+        if self._linked:
+            return super()._get_lower_bound(key)
+        tree.HNAVL.walk_count += 1
+        key_at = self._snapshot.key_at
+        i = 0 if self._count else -1
+        rank = 0
+        while i >= 0:
+            rec = self._record(i)
+            if key_at(rec[0]) < key:
+                rank += self._size_at(rec[1]) + 1
+                i = rec[2]
+            else:
+                i = rec[1]
+        return rank
+
+    def count_range(self, lo: str = None, hi: str = None) -> int:
+        if self._linked:
+            return super().count_range(lo, hi)
+        upper = self._count if hi is None else self._get_lower_bound(hi)
+        lower = 0 if lo is None else self._get_lower_bound(lo)
+        return max(upper - lower, 0)
+
+    def equal_range(self, key: str, occurrence: int = 0, spine: list = None) -> tuple:
+        """
+        Same contract as HNAVL.equal_range, answered from the buffer. A
+        spine needs linked Nodes, so asking for one materializes the level.
+        """
+        if self._linked or spine is not None:
+            return super().equal_range(key, occurrence, spine)
+        tree.HNAVL.walk_count += 1
+        key_at = self._snapshot.key_at
+        i = 0 if self._count else -1
+        rank = 0
+        while i >= 0:
+            rec = self._record(i)
+            k = key_at(rec[0])
+            if key < k:
+                i = rec[1]
+            elif key > k:
+                rank += self._size_at(rec[1]) + 1
+                i = rec[2]
+            else:
+                break
+        if i < 0:
+            return -1, 0, None, None
+        top, top_rec = i, rec
+
+        first, first_rec = top, top_rec
+        first_rank = rank + self._size_at(top_rec[1])
+        lower = rank
+        i = top_rec[1]
+        while i >= 0:
+            rec = self._record(i)
+            if key_at(rec[0]) < key:
+                lower += self._size_at(rec[1]) + 1
+                i = rec[2]
+            else:
+                first, first_rec = i, rec
+                first_rank = lower + self._size_at(rec[1])
+                i = rec[1]
+
+        upper = rank + self._size_at(top_rec[1]) + 1
+        i = top_rec[2]
+        while i >= 0:
+            rec = self._record(i)
+            if key < key_at(rec[0]):
+                i = rec[1]
+            else:
+                upper += self._size_at(rec[1]) + 1
+                i = rec[2]
+        count = upper - first_rank
+
+        first_node = self._node(first, first_rec)
+        if occurrence == 0:
+            return first_rank, count, first_node, first_node
+        if not 0 <= occurrence < count:
+            return first_rank, count, first_node, None
+        index = first_rank + occurrence - rank
+        i, rec = top, top_rec
+        while True:
+            left_size = self._size_at(rec[1])
+            if index == left_size:
+                return first_rank, count, first_node, self._node(i, rec)
+            elif index < left_size:
+                i = rec[1]
+            else:
+                index -= (left_size + 1)
+                i = rec[2]
+            rec = self._record(i)
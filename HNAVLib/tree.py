@@ -26,6 +26,9 @@
 # HNAVL.py
 
 import subprocess, threading, re, os, sys, inspect, shutil, argparse, random, math, fnmatch, json, types
+import gc, heapq, io
+from collections import OrderedDict
+from operator import attrgetter
 
 """
 
@@ -36,22 +39,146 @@ import subprocess, threading, re, os, sys, inspect, shutil, argparse, random, ma
 class Node:
     # The building block of the tree.
     # Each node is a "container" that can hold its own nested tree.
+    # __slots__ drops the per-node __dict__, roughly halving the footprint
+    # of a level when millions of paths are loaded.
+    __slots__ = ("key", "left", "right", "height", "size", "total", "child_tree")
+
     def __init__(self, key: str):
         self.key = key # The string identifier (e.g., "bar").
         self.left = None
         self.right = None
         self.height = 1
         self.size = 1 # Augmented total of nodes in the *current* level's subtree (for  indexing).
+        self.total = 1 # Like size, but also counting every node nested in their child_trees.
         self.child_tree = None  # Initialized only when a child is added
 # **`child_tree`**:  A pointer to a *new* instance of `HNAVL`, representing the nested strings (e.g., the "foos" inside "bar").
 
+class PathCache:
+    """
+    Bounded LRU cache of parsed paths: maps a path string to the tuple of
+    (segment, target_index, explicit_index) steps from HNAVL._parse_path,
+    so hot paths skip the split and `[n]` decoding on every call.
+    A maxsize of 0 disables caching. Safe to share between threads.
+    """
+    __slots__ = ("maxsize", "hits", "misses", "_entries", "_lock")
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, path: str) -> tuple:
+        entries = self._entries
+        with self._lock:
+            steps = entries.get(path)
+            if steps is not None:
+                self.hits += 1
+                entries.move_to_end(path)
+                return steps
+            self.misses += 1
+        # Parse outside the lock; a racing thread may parse the same path too.
+        steps = HNAVL._parse_path(path)
+        if self.maxsize > 0:
+            with self._lock:
+                entries[path] = steps
+                if len(entries) > self.maxsize:
+                    entries.popitem(last=False)
+        return steps
+
+    def resize(self, maxsize: int):
+        """Changes the bound, evicting least recently used entries as needed."""
+        with self._lock:
+            self.maxsize = maxsize
+            while self._entries and len(self._entries) > max(maxsize, 0):
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+class SymbolTable:
+    """
+    Interns the key strings of one hierarchy, owned by its root HNAVL.
+    Every node holding a given segment then shares a single str object
+    instead of its own copy from path.split(), and comparing a looked-up
+    segment with the node that holds it stops at CPython's identity check
+    instead of comparing characters. That pays off when names repeat
+    across levels (HNAVLdoc's Search/Insert/Delete under every group);
+    unique names only gain a table entry each.
+    The table only grows. Symbols stay in it after the last node using
+    them is deleted, so a hierarchy whose names churn should leave
+    intern_keys off.
+    """
+    __slots__ = ("_table",)
+
+    def __init__(self):
+        self._table = {}
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._table
+
+    def intern(self, key: str) -> str:
+        """Returns the table's copy of key, adding key if it is new."""
+        return self._table.setdefault(key, key)
+
+    def lookup(self, key: str) -> str:
+        """The table's copy of key if it has one, else key (nothing is added)."""
+        return self._table.get(key, key)
+
 ### Core AVL & Order Statistic Logic
 
 # These functions handle the balancing and indexing of a single level of the hierarchy.
 
 class HNAVL:
-    def __init__(self):
+    # __weakref__ lets ConcurrentHNAVL key its per-level locks weakly.
+    __slots__ = ("root", "symbols", "nested", "__weakref__")
+
+    # Instrumentation shared by all levels: root-to-leaf walks made by the
+    # search primitives, and path segments handled by insert_path.
+    walk_count = 0
+    segment_count = 0
+
+    # Parsed-path cache shared by insert_path and resolve_path.
+    path_cache = PathCache()
+
+    # _merge_nodes rebuilds the level once k new nodes cost more to insert
+    # one by one (~k log n) than a linear merge and rebuild (~n + k) does;
+    # this is the measured ratio between the two per-node costs.
+    merge_rebuild_factor = 2
+
+    # Whether insert_path/insert_paths intern segments through the root's
+    # SymbolTable (created on first use; nested levels never get one). Off
+    # by default: it pays off when names repeat across levels (see
+    # bench_intern), and the table never shrinks.
+    intern_keys = False
+
+    # Whether Node.total is kept up to date. count_paths, select_path,
+    # rank_path and iter_paths(start=) need it; everything else ignores it.
+    # Off by default, since every insert, rotation and delete pays for it.
+    # Set it before the hierarchy gets its first node: turning it on later
+    # does not recompute the totals already there.
+    track_totals = False
+
+    def __init__(self, nested: bool = False):
         self.root = None
+        self.symbols = None
+        # True for a child_tree: its Node.total also counts in every level above
+        self.nested = nested
+
+    def _symbol_table(self) -> SymbolTable:
+        if self.symbols is None:
+            self.symbols = SymbolTable()
+        return self.symbols
 
     def _get_height(self, node: Node) -> int:
         """Returns the height of a node, handling None as 0."""
@@ -61,14 +188,26 @@ class HNAVL:
         """Returns the augmented subtree size, handling None as 0."""
         return node.size if node else 0
 
+    def _get_total(self, node: Node) -> int:
+        """Returns the nested subtree total, handling None as 0."""
+        return node.total if node else 0
+
+    def _total(self) -> int:
+        """Number of nodes in this level and all levels nested below it."""
+        return self.root.total if self.root else 0
+
     def _update_metadata(self, node: Node):
         """
-        Recalculates node.height and node.size based on children.
+        Recalculates node.height, node.size and (if track_totals) node.total
+        based on children.
         Formula: size = 1 + left.size + right.size
+                 total = 1 + left.total + right.total + (child_tree's total)
         """
         if node:
             node.height = 1 + max(self._get_height(node.left), self._get_height(node.right))
             node.size = 1 + self._get_size(node.left) + self._get_size(node.right)
+            if self.track_totals:
+                node.total = 1 + self._get_total(node.left) + self._get_total(node.right) + (node.child_tree._total() if node.child_tree else 0)
 
     def _rotate_left(self, x: Node) -> Node:
         """Performs a left rotation and updates metadata for affected nodes."""
@@ -121,32 +260,182 @@ class HNAVL:
         Standard OST-AVL insertion. 
         If key exists, treats it as a duplicate (Separate Node approach).
         Returns the reference to the newly created/inserted Node.
+        Like the other per-level mutators, this only works on the root
+        level while track_totals is on (see _check_mutable).
         Complexity: $O(\\log n)$
         """
-        new_node_ref = [None] # Use list to capture reference from recursive calls
+        self._check_mutable()
+        return self._insert_node(Node(key))
 
-        def _insert(node, key):
-            if not node:
-                new_node = Node(key)
-                new_node_ref[0] = new_node
-                return new_node
-            
-            if key < node.key:
-                node.left = _insert(node.left, key)
+    def _check_mutable(self):
+        """
+        Per-level mutators cannot reach the Node.total of the levels above
+        a nested level, so with track_totals on they refuse to run there;
+        insert_path, insert_paths and delete_path keep those totals right.
+        """
+        if self.nested and self.track_totals:
+            raise ValueError("With track_totals on, nested levels change through insert_path, insert_paths and delete_path only.")
+
+    def _insert_node(self, new_node: Node) -> Node:
+        """
+        Iterative insertion of an already constructed Node.
+        Walks top-down recording the spine, then rebalances bottom-up and
+        stops as soon as a subtree's height is unchanged (every ancestor
+        above that point only needs its size bumped).
+        """
+        HNAVL.walk_count += 1
+        key = new_node.key
+        added = new_node.total  # rotations may change new_node.total below
+        path = []
+        curr = self.root
+        while curr:
+            path.append(curr)
+            # Key >= node.key handles duplicates by inserting into right subtree
+            curr = curr.left if key < curr.key else curr.right
+
+        if not path:
+            self.root = new_node
+            return new_node
+
+        parent = path[-1]
+        if key < parent.key:
+            parent.left = new_node
+        else:
+            parent.right = new_node
+
+        for i in range(len(path) - 1, -1, -1):
+            node = path[i]
+            old_height = node.height
+            subtree = self._rebalance(node)
+            if subtree is not node:
+                if i == 0:
+                    self.root = subtree
+                elif path[i - 1].left is node:
+                    path[i - 1].left = subtree
+                else:
+                    path[i - 1].right = subtree
+            if subtree.height == old_height:
+                if self.track_totals:
+                    for ancestor in path[:i]:
+                        ancestor.size += 1
+                        ancestor.total += added
+                else:
+                    for ancestor in path[:i]:
+                        ancestor.size += 1
+                break
+        return new_node
+
+    def delete_rank(self, index: int) -> Node:
+        """
+        Removes the Node at a 0-based index and returns it detached from the
+        level (None if out of range). Its child_tree goes with it, so the
+        whole nested subtree is freed once the caller drops the node.
+        A node with two children is replaced by its in-order successor node
+        (relinked, not copied), so other nodes keep their identity.
+        Complexity: $O(\\log n)$
+        """
+        self._check_mutable()
+        return self._delete_rank(index)
+
+    def _delete_rank(self, index: int) -> Node:
+        """delete_rank without the nested-level check, for the path methods."""
+        HNAVL.walk_count += 1
+        if not 0 <= index < self._get_size(self.root):
+            return None
+        path = []
+        curr = self.root
+        while True:
+            left_size = self._get_size(curr.left)
+            if index == left_size:
+                break
+            path.append(curr)
+            if index < left_size:
+                curr = curr.left
             else:
-                # Key >= node.key handles duplicates by inserting into right subtree
-                node.right = _insert(node.right, key)
-                
-            return self._rebalance(node)
+                index -= (left_size + 1)
+                curr = curr.right
+        target = curr
+
+        if target.left and target.right:
+            # Unhook the successor and move it into target's position; the
+            # spine to rebalance runs through it down to its old parent.
+            succ_path = []
+            succ = target.right
+            while succ.left:
+                succ_path.append(succ)
+                succ = succ.left
+            if succ_path:
+                succ_path[-1].left = succ.right
+                succ.right = target.right
+            succ.left = target.left
+            replacement = succ
+            spine = path + [succ] + succ_path
+        else:
+            replacement = target.left or target.right
+            spine = path
+
+        if not path:
+            self.root = replacement
+        elif path[-1].left is target:
+            path[-1].left = replacement
+        else:
+            path[-1].right = replacement
+
+        for i in range(len(spine) - 1, -1, -1):
+            node = spine[i]
+            subtree = self._rebalance(node)
+            if subtree is not node:
+                if i == 0:
+                    self.root = subtree
+                elif spine[i - 1].left is node:
+                    spine[i - 1].left = subtree
+                else:
+                    spine[i - 1].right = subtree
+
+        target.left = target.right = None
+        target.height = target.size = 1
+        if self.track_totals:
+            target.total = 1 + (target.child_tree._total() if target.child_tree else 0)
+        return target
+
+    def _refresh_totals(self, index: int):
+        """
+        Recomputes total on the path from the root down to the node at a
+        0-based index, after that node's child_tree has changed.
+        """
+        HNAVL.walk_count += 1
+        spine = []
+        curr = self.root
+        while curr:
+            spine.append(curr)
+            left_size = self._get_size(curr.left)
+            if index == left_size:
+                break
+            elif index < left_size:
+                curr = curr.left
+            else:
+                index -= (left_size + 1)
+                curr = curr.right
+        for node in reversed(spine):
+            node.total = 1 + self._get_total(node.left) + self._get_total(node.right) + (node.child_tree._total() if node.child_tree else 0)
 
-        self.root = _insert(self.root, key)
-        return new_node_ref[0]
+    def delete_at_level(self, key: str, occurrence: int = 0) -> Node:
+        """
+        Removes the 0-based `occurrence` of key from this level and returns
+        it, or None if there is no such occurrence.
+        Complexity: $O(\\log n)$
+        """
+        first_rank, count, first_node, target_node = self.equal_range(key, occurrence)
+        if not target_node:
+            return None
+        return self.delete_rank(first_rank + occurrence)
 
     def find_first(self, key: str) -> Node:
         """
         Locates the first occurrence of a key at the current level.
         Used by the path-parser to navigate downwards.
         """
+        HNAVL.walk_count += 1
         curr = self.root
         first_found = None
         while curr:
@@ -165,6 +454,7 @@ class HNAVL:
         Returns the Node at a specific 0-based index using subtree sizes.
         Complexity: $O(\\log n)$
         """
+        HNAVL.walk_count += 1
         curr = self.root
         while curr:
             left_size = self._get_size(curr.left)
@@ -184,11 +474,13 @@ class HNAVL:
     def get_rank(self, key: str) -> int:
         """
         Returns the 0-based index (rank) of the first occurrence of key.
-        Because duplicates (key >= node.key) are always in the right subtree, 
-        the first occurrence is the first time we encounter the key during search.
+        Duplicates are inserted into the right subtree (key >= node.key), so
+        the occurrences of a key form one contiguous in-order run.
         """
+        HNAVL.walk_count += 1
         curr = self.root
         rank = 0
+        first_rank = -1
         while curr:
             if key < curr.key:
                 curr = curr.left
@@ -196,11 +488,14 @@ class HNAVL:
                 rank += self._get_size(curr.left) + 1
                 curr = curr.right
             else:
-                # Found the key. All nodes in left subtree are < key.
-                return rank + self._get_size(curr.left)
-        return -1
+                # Found the key, but rotations can leave earlier duplicates
+                # in the left subtree, so keep looking there.
+                first_rank = rank + self._get_size(curr.left)
+                curr = curr.left
+        return first_rank
 
     def _get_upper_bound(self, key: str) -> int:
+        HNAVL.walk_count += 1
         curr = self.root
         rank = 0
         while curr:
@@ -211,24 +506,190 @@ class HNAVL:
                 curr = curr.right
         return rank
 
+    def _get_lower_bound(self, key: str) -> int:
+        """Number of nodes whose key is < key (the rank key would get)."""
+        HNAVL.walk_count += 1
+        curr = self.root
+        rank = 0
+        while curr:
+            if curr.key < key:
+                rank += self._get_size(curr.left) + 1
+                curr = curr.right
+            else:
+                curr = curr.left
+        return rank
+
     def count_key(self, key: str) -> int:
-        rank = self.get_rank(key)
-        if rank == -1:
-            return 0
-        upper = self._get_upper_bound(key)
-        return upper - rank
+        return self.equal_range(key)[1]
 
-    def insert_path(self, path: str):
-        # 1. Split path and prepare to iterate
+    def count_range(self, lo: str = None, hi: str = None) -> int:
+        """
+        Number of nodes with lo <= key < hi (None leaves that end open),
+        duplicates included, from the subtree sizes alone.
+        Complexity: $O(\\log n)$
+        """
+        upper = self._get_size(self.root) if hi is None else self._get_lower_bound(hi)
+        lower = 0 if lo is None else self._get_lower_bound(lo)
+        return max(upper - lower, 0)
+
+    def iter_ranks(self, start: int, stop: int = None):
+        """
+        Lazily yields the Nodes at ranks start <= rank < stop (like a slice,
+        stop defaults to the end). One descent to `start`, then an in-order
+        walk with an explicit stack.
+        Complexity: $O(\\log n + k)$ for k nodes
+        """
+        HNAVL.walk_count += 1
+        start = max(start, 0)
+        remaining = (self._get_size(self.root) if stop is None else stop) - start
+        stack = []
+        curr = self.root
+        index = start
+        while curr and remaining > 0:
+            left_size = self._get_size(curr.left)
+            if index < left_size:
+                stack.append(curr)
+                curr = curr.left
+            elif index == left_size:
+                stack.append(curr)
+                break
+            else:
+                index -= (left_size + 1)
+                curr = curr.right
+        while stack and remaining > 0:
+            node = stack.pop()
+            yield node
+            remaining -= 1
+            curr = node.right
+            while curr:
+                stack.append(curr)
+                curr = curr.left
+
+    def iter_range(self, lo: str = None, hi: str = None):
+        """
+        Lazily yields the Nodes with lo <= key < hi in order (None leaves
+        that end open), duplicates in insertion order. One descent to the
+        first key >= lo, then an in-order walk with an explicit stack.
+        Complexity: $O(\\log n + k)$ for k nodes
+        """
+        HNAVL.walk_count += 1
+        stack = []
+        curr = self.root
+        while curr:
+            if lo is None or not curr.key < lo:
+                stack.append(curr)
+                curr = curr.left
+            else:
+                curr = curr.right
+        while stack:
+            node = stack.pop()
+            if hi is not None and not node.key < hi:
+                return
+            yield node
+            curr = node.right
+            while curr:
+                stack.append(curr)
+                curr = curr.left
+
+    def equal_range(self, key: str, occurrence: int = 0, spine: list = None) -> tuple:
+        """
+        Fused duplicate-aware lookup: a single descent to the highest node
+        holding key, whose subtree contains the whole run of duplicates, then
+        short walks below it for the run's bounds and its n-th member.
+        Returns (first_rank, count, first_node, nth_node); nth_node is the
+        0-based `occurrence` of key, or None if out of range. A missing key
+        gives (-1, 0, None, None).
+        If spine is a list, the nodes from the root down to nth_node are
+        appended to it, so a caller changing what lies below nth_node can
+        fix their Node.total without walking down again. When nth_node is
+        None, whatever was appended is meaningless.
+        Complexity: $O(\\log n)$
+        """
+        HNAVL.walk_count += 1
+        curr = self.root
+        rank = 0
+        while curr:
+            if spine is not None:
+                spine.append(curr)
+            if key < curr.key:
+                curr = curr.left
+            elif key > curr.key:
+                rank += self._get_size(curr.left) + 1
+                curr = curr.right
+            else:
+                break
+        if not curr:
+            return -1, 0, None, None
+        top = curr
+        # spine[:top_mark] ends at top; mark ends at first_node
+        top_mark = mark = len(spine) if spine is not None else 0
+
+        # Lower bound: the left subtree holds keys <= key.
+        first_node = top
+        first_rank = rank + self._get_size(top.left)
+        lower = rank
+        curr = top.left
+        while curr:
+            if spine is not None:
+                spine.append(curr)
+            if curr.key < key:
+                lower += self._get_size(curr.left) + 1
+                curr = curr.right
+            else:
+                first_node = curr
+                first_rank = lower + self._get_size(curr.left)
+                mark = len(spine) if spine is not None else 0
+                curr = curr.left
+
+        # Upper bound: the right subtree holds keys >= key.
+        upper = rank + self._get_size(top.left) + 1
+        curr = top.right
+        while curr:
+            if key < curr.key:
+                curr = curr.left
+            else:
+                upper += self._get_size(curr.left) + 1
+                curr = curr.right
+        count = upper - first_rank
+
+        if occurrence == 0:
+            if spine is not None:
+                # Drop what the lower bound walk visited below first_node
+                del spine[mark:]
+            return first_rank, count, first_node, first_node
+        if not 0 <= occurrence < count:
+            return first_rank, count, first_node, None
+        if spine is not None:
+            del spine[top_mark:]
+        # Select inside top's subtree, which starts at in-order rank `rank`.
+        index = first_rank + occurrence - rank
+        curr = top
+        while True:
+            left_size = self._get_size(curr.left)
+            if index == left_size:
+                return first_rank, count, first_node, curr
+            elif index < left_size:
+                curr = curr.left
+            else:
+                index -= (left_size + 1)
+                curr = curr.right
+            if spine is not None:
+                spine.append(curr)
+
+    @staticmethod
+    def _parse_path(path: str) -> tuple:
+        """
+        Splits a path into a tuple of (segment, target_index, explicit_index)
+        steps, folding each `[n]` index segment into the step before it.
+        """
         segments = path.strip("/").split("/")
-        current_tree = self
-        
+        steps = []
         i = 0
         while i < len(segments):
             segment = segments[i]
             target_index = 0  # Default to the first occurrence
             explicit_index = False
-            
+
             # Check if next segment is an index like [1]
             if i + 1 < len(segments) and segments[i+1].startswith("["):
                 try:
@@ -239,65 +700,704 @@ class HNAVL:
                 except ValueError:
                     pass
 
-            # Locate the first instance of this key
-            first_rank = current_tree.get_rank(segment)
+            steps.append((segment, target_index, explicit_index))
+            i += 1
+        return tuple(steps)
+
+    def insert_path(self, path: str):
+        # 1. Split path (via the shared cache) and prepare to iterate
+        steps = self.path_cache.get(path)
+        last = len(steps) - 1
+        current_tree = self
+        HNAVL.segment_count += len(steps)
+        intern = self._symbol_table().intern if self.intern_keys else str
+        # Nodes passed on the way down through the reused levels; each one
+        # gains every node created below it
+        spine = [] if self.track_totals else None
+        keys = [intern(segment) for segment, target_index, explicit_index in steps]
+
+        for i, (segment, target_index, explicit_index) in enumerate(steps):
+            segment = keys[i]
+            # The last segment is never reused: it always becomes a new node
+            if i < last:
+                # Locate the run of this key and the requested occurrence in one descent
+                mark = len(spine) if spine is not None else 0
+                first_rank, count, first_node, target_node = current_tree.equal_range(segment, target_index, spine)
+                if count > 1 and not explicit_index:
+                    raise ValueError(f"Ambiguous path: multiple occurrences of '{segment}' at this level. Specify [n] to choose.")
+                if target_node:
+                    # Descend (leaf nodes keep child_tree = None until a child is added)
+                    if not target_node.child_tree:
+                        target_node.child_tree = HNAVL(nested=True)
+                    current_tree = target_node.child_tree
+                    continue
+                if spine is not None:
+                    del spine[mark:]
 
-            count = current_tree.count_key(segment)
-            if i < len(segments) - 1 and count > 1 and not explicit_index:
+            # Every step from i on creates a node (after the run of its key).
+            # They form a simple chain: build it bottom-up, so its head
+            # carries its total, and link it in with a single insertion.
+            segments = keys[i:]
+            node = None
+            for segment in reversed(segments):
+                parent = Node(segment)
+                if node:
+                    parent.child_tree = HNAVL(nested=True)
+                    parent.child_tree.root = node
+                    parent.total += node.total
+                node = parent
+            current_tree._insert_node(node)
+            if spine is not None:
+                for ancestor in spine:
+                    ancestor.total += len(segments)
+            return
+
+    def resolve_path(self, path: str) -> Node:
+        """
+        Read-only counterpart of insert_path: returns the Node the path
+        names, or None if any segment is missing. `[n]` picks the n-th
+        occurrence of the segment before it; an intermediate segment with
+        several occurrences and no `[n]` is ambiguous, as in insert_path.
+        Nothing in the hierarchy is touched (no child trees are allocated),
+        so concurrent readers are safe as long as no writer is active.
+        Complexity: $O(depth \\cdot \\log n)$
+        """
+        steps = self.path_cache.get(path)
+        last = len(steps) - 1
+        current_tree = self
+        for i, (segment, target_index, explicit_index) in enumerate(steps):
+            first_rank, count, first_node, target_node = current_tree.equal_range(segment, target_index)
+            if i < last and count > 1 and not explicit_index:
                 raise ValueError(f"Ambiguous path: multiple occurrences of '{segment}' at this level. Specify [n] to choose.")
-            
-            # Find existing at position OR create new
-            target_node = None
-            if first_rank != -1:
-                potential = current_tree.select(first_rank + target_index)
-                if potential and potential.key == segment:
-                    # Only reuse if NOT the last segment
-                    if i < len(segments) - 1:
-                        target_node = potential
+            if not target_node or i == last:
+                return target_node
+            current_tree = target_node.child_tree
+            if not current_tree:
+                return None
+        return None
 
+    def delete_path(self, path: str, recursive: bool = True) -> Node:
+        """
+        Removes the node a path names (same `[n]` rules as resolve_path) and
+        returns it, or None if the path does not exist. Unless recursive,
+        a node that still has children raises ValueError instead. A level
+        left empty is released from its parent (child_tree back to None).
+        Complexity: $O(depth \\cdot \\log n)$
+        """
+        steps = self.path_cache.get(path)
+        last = len(steps) - 1
+        current_tree = self
+        parent_node = None
+        spine = [] if self.track_totals else None
+        for i, (segment, target_index, explicit_index) in enumerate(steps):
+            first_rank, count, first_node, target_node = current_tree.equal_range(segment, target_index, spine if i < last else None)
+            if i < last and count > 1 and not explicit_index:
+                raise ValueError(f"Ambiguous path: multiple occurrences of '{segment}' at this level. Specify [n] to choose.")
             if not target_node:
-                target_node = current_tree.insert_at_level(segment)
-
-            # Descend
+                return None
+            if i == last:
+                break
             if not target_node.child_tree:
-                target_node.child_tree = HNAVL()
+                return None
+            parent_node = target_node
             current_tree = target_node.child_tree
-            i += 1
 
-    def print_tree(self, indent: int = 0, path_prefix: str = "", is_last: bool = True, parent_prefixes: str = ""):
-            """
-            Prints the hierarchy with surgical precision using ├── and └──.
-            Maintains in-order traversal and duplicate handling.
-            """
-            def _get_is_last(node, parent_is_last):
-                # A node is the 'last' in this AVL level if it has no right child
-                # AND its parent was already the last in the traversal.
-                return parent_is_last and node.right is None
-
-            def _print_node(node, current_indent, current_path, node_is_last, prefixes):
-                if not node:
-                    return
-
-                # 1. Traverse Left (Never the 'last' node of this level)
-                _print_node(node.left, current_indent, current_path, False, prefixes)
-
-                # 2. Process Current Node
-                full_path = f"{current_path}/{node.key}" if current_path else node.key
-                
-                # Determine if this specific node is the absolute end of this AVL level
-                is_really_last = node_is_last and (node.right is None)
-                marker = "└── " if is_really_last else "├── "
-                
-                print(f"{prefixes}{marker}{full_path}")
-
-                # 3. Descend into Nested Child Tree
-                if node.child_tree and node.child_tree.root:
-                    # Add a bar if we aren't at the end; add space if we are
-                    new_prefix = prefixes + ("    " if is_really_last else "│   ")
-                    node.child_tree.print_tree(current_indent + 1, full_path, True, new_prefix)
-
-                # 4. Traverse Right
-                _print_node(node.right, current_indent, current_path, node_is_last, prefixes)
-
-            _print_node(self.root, indent, path_prefix, is_last, parent_prefixes)
+        if not recursive and target_node.child_tree and target_node.child_tree.root:
+            raise ValueError(f"'{path}' has children; pass recursive=True to delete them too.")
+        removed = current_tree._delete_rank(first_rank + target_index)
+        if parent_node and not current_tree.root:
+            parent_node.child_tree = None
+        if spine is not None:
+            for ancestor in spine:
+                ancestor.total -= removed.total
+        return removed
+
+    def contains_path(self, path: str) -> bool:
+        """True if resolve_path(path) finds a node."""
+        return self.resolve_path(path) is not None
+
+    def count_paths(self, path: str = "") -> int:
+        """
+        Number of paths below `path` (not counting the path itself), or in
+        the whole hierarchy if path is empty; 0 if the path does not exist.
+        Read from Node.total, so nothing below the path is visited; needs
+        track_totals (ValueError otherwise).
+        Complexity: $O(depth \\cdot \\log n)$
+        """
+        self._require_totals()
+        if not path.strip("/"):
+            return self._total()
+        node = self.resolve_path(path)
+        if node is None or node.child_tree is None:
+            return 0
+        return node.child_tree._total()
+
+    ## Flattened Path Order
+
+    # The whole hierarchy read as the one sequence iter_paths and print_tree
+    # emit. A node of a level is preceded there by everything ranked before
+    # it in the level, nested levels included: the totals of the left
+    # subtrees passed on the way down, plus 1 + child_tree total for each
+    # node passed on the right.
+
+    def _require_totals(self):
+        if not self.track_totals:
+            raise ValueError("Node.total is not maintained: set HNAVL.track_totals = True before building the hierarchy.")
+
+    def _total_before(self, index: int) -> int:
+        """Nodes (nested levels included) ranked before a 0-based index of this level."""
+        HNAVL.walk_count += 1
+        before = 0
+        curr = self.root
+        while curr:
+            left_size = curr.left.size if curr.left else 0
+            if index <= left_size:
+                if index == left_size:
+                    return before + (curr.left.total if curr.left else 0)
+                curr = curr.left
+            else:
+                index -= (left_size + 1)
+                before += curr.total - (curr.right.total if curr.right else 0)
+                curr = curr.right
+        return before
+
+    def _preorder_frames(self, index: int, path_prefix: str, is_last: bool) -> list:
+        """
+        The _walk frames positioned at a 0-based index of the flattened
+        order: one in-order stack per level on the way down, each ancestor
+        level's already past the node it descended through, the last one
+        with the target on top. None if index is out of range.
+        """
+        self._require_totals()
+        if index < 0:
+            return None
+        frames = []
+        level, prefix, depth, level_is_last = self, path_prefix, 0, is_last
+        while level and level.root:
+            HNAVL.walk_count += 1
+            stack = []
+            curr = level.root
+            while curr:
+                left_total = curr.left.total if curr.left else 0
+                if index < left_total:
+                    stack.append(curr)
+                    curr = curr.left
+                    continue
+                index -= left_total
+                if index == 0:
+                    stack.append(curr)
+                    frames.append((stack, prefix, depth, level_is_last))
+                    return frames
+                index -= 1
+                child_total = curr.child_tree._total() if curr.child_tree else 0
+                if index < child_total:
+                    node = curr.right
+                    while node:
+                        stack.append(node)
+                        node = node.left
+                    frames.append((stack, prefix, depth, level_is_last))
+                    prefix = f"{prefix}/{curr.key}" if prefix else curr.key
+                    level, depth, level_is_last = curr.child_tree, depth + 1, True
+                    break
+                index -= child_total
+                curr = curr.right
+            else:
+                return None
+        return None
+
+    def select_path(self, index: int) -> tuple:
+        """
+        Returns (full_path, node) for the 0-based index of the flattened
+        order (as iter_paths yields it), or None if out of range. Needs
+        track_totals.
+        Complexity: $O(depth \\cdot \\log n)$
+        """
+        frames = self._preorder_frames(index, "", True)
+        if not frames:
+            return None
+        stack, prefix = frames[-1][:2]
+        node = stack[-1]
+        return (f"{prefix}/{node.key}" if prefix else node.key), node
+
+    def rank_path(self, path: str) -> int:
+        """
+        0-based index of the node a path names in the flattened order, or -1
+        if the path does not exist. Same `[n]` rules as resolve_path, so
+        duplicates can be told apart; select_path is its inverse.
+        Complexity: $O(depth \\cdot \\log n)$
+        """
+        self._require_totals()
+        steps = self.path_cache.get(path)
+        last = len(steps) - 1
+        current_tree = self
+        position = 0
+        for i, (segment, target_index, explicit_index) in enumerate(steps):
+            first_rank, count, first_node, target_node = current_tree.equal_range(segment, target_index)
+            if i < last and count > 1 and not explicit_index:
+                raise ValueError(f"Ambiguous path: multiple occurrences of '{segment}' at this level. Specify [n] to choose.")
+            if not target_node:
+                return -1
+            position += current_tree._total_before(first_rank + target_index)
+            if i == last:
+                return position
+            current_tree = target_node.child_tree
+            if not current_tree:
+                return -1
+            position += 1
+        return -1
+
+    @classmethod
+    def from_paths(cls, paths, presorted: bool = False, pause_gc: bool = False) -> "HNAVL":
+        """
+        Builds a hierarchy equivalent to calling insert_path on each path in
+        order, but without any rotations: the paths are streamed once into a
+        per-level grouping, then every level is built balanced from its
+        sorted run of nodes.
+        presorted: the paths arrive ordered segment by segment (as by
+                   sorting on path.split("/")), so the per-level sort is
+                   skipped; out-of-order input raises ValueError.
+        pause_gc: as for insert_paths.
+        Complexity: $O(n)$ presorted, $O(n \\log n)$ otherwise.
+        """
+        tree = cls()
+        tree.insert_paths(paths, presorted, pause_gc)
+        return tree
+
+    @classmethod
+    def parallel_build(cls, paths, workers: int = None, presorted: bool = False) -> "HNAVL":
+        """
+        from_paths spread over a process pool. A path only ever interacts
+        with paths that share its first segment, so the input is grouped
+        by first segment (keeping the order within each group). Each worker
+        builds the hierarchy for a contiguous range of first segments and
+        ships it back as snapshot bytes (see HNAVLib.snapshot), whose nested
+        levels stay serialized until first used. The root level is then
+        rebuilt balanced over all the workers' top-level nodes, in order.
+        workers defaults to os.cpu_count(); with one worker or one group
+        this is plain from_paths.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        from . import snapshot
+        workers = workers or os.cpu_count() or 1
+        groups = {}
+        for path in paths:
+            groups.setdefault(path.strip("/").split("/", 1)[0], []).append(path)
+        if workers <= 1 or len(groups) <= 1:
+            return cls.from_paths((p for group in groups.values() for p in group), presorted)
+
+        # A few chunks per worker evens out skewed groups.
+        firsts = sorted(groups)
+        total = sum(len(group) for group in groups.values())
+        target = total / (workers * 4)
+        chunks = [[]]
+        for first in firsts:
+            if len(chunks[-1]) >= target:
+                chunks.append([])
+            chunks[-1] += groups[first]
+        del groups
+
+        nodes = []
+        with ProcessPoolExecutor(workers) as pool:
+            for data in pool.map(_build_snapshot, chunks, [presorted] * len(chunks)):
+                nodes += snapshot.loads(data)._inorder_nodes()
+        tree = cls()
+        tree._build_from_sorted(nodes)
+        return tree
+
+    def insert_paths(self, paths, presorted: bool = False, pause_gc: bool = False):
+        """
+        Inserts a batch of paths with the same result as calling insert_path
+        on each one in order, but every shared prefix node is located once
+        and the new nodes of each level are added in a single merge.
+        The batch is replayed into a per-level plan before the hierarchy is
+        touched, so an ambiguous path raises ValueError with nothing applied.
+        presorted: as for from_paths.
+        pause_gc:  pause the cyclic garbage collector meanwhile. The plan is
+                   made of many small containers, and with a large hierarchy
+                   alive every automatic collection rescans all of its nodes.
+                   The switch is process-wide, so only pass it when no other
+                   thread depends on collections running.
+        """
+        if not pause_gc:
+            self._insert_paths(paths, presorted)
+            return
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self._insert_paths(paths, presorted)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def _insert_paths(self, paths, presorted: bool):
+        # A plan is [tree, keys]: tree is the existing level (or None for a
+        # level that does not exist yet) and keys maps each key seen at this
+        # level to [existing_count, first_node, touched, new]. touched maps an
+        # existing occurrence to (node, plan); new holds one plan (or None for
+        # a leaf) per node to create, in insertion order.
+        top = [self, {}]
+        # (step, plan) for the previous path's leading steps that would
+        # resolve the same way again, so a following path with the same
+        # prefix resumes below it instead of starting at the top.
+        cursor = []
+        intern = self._symbol_table().intern if self.intern_keys else str
+        for path in paths:
+            steps = self._parse_path(path)
+            last = len(steps) - 1
+            depth = 0
+            limit = min(len(cursor), last)
+            while depth < limit and cursor[depth][0] == steps[depth]:
+                depth += 1
+            del cursor[depth:]
+            plan = cursor[-1][1] if cursor else top
+            for i in range(depth, last + 1):
+                segment, target_index, explicit_index = step = steps[i]
+                tree, keys = plan
+                entry = keys.get(segment)
+                if entry is None:
+                    if presorted and keys and not next(reversed(keys)) < segment:
+                        raise ValueError(f"presorted=True: '{segment}' arrived after '{next(reversed(keys))}'")
+                    segment = intern(segment)
+                    first_rank, existing, first_node, _ = tree.equal_range(segment) if tree else (-1, 0, None, None)
+                    entry = keys[segment] = [existing, first_node, {}, []]
+                existing, first_node, touched, new = entry
+                if i == last:
+                    new.append(None)
+                    break
+                if existing + len(new) > 1 and not explicit_index:
+                    raise ValueError(f"Ambiguous path: multiple occurrences of '{segment}' at this level. Specify [n] to choose.")
+                if 0 <= target_index < existing:
+                    reused = touched.get(target_index)
+                    if reused is None:
+                        node = first_node if target_index == 0 else tree.equal_range(segment, target_index)[3]
+                        reused = touched[target_index] = (node, [node.child_tree, {}])
+                    plan = reused[1]
+                elif 0 <= target_index - existing < len(new):
+                    plan = new[target_index - existing]
+                    if plan is None:
+                        plan = new[target_index - existing] = [None, {}]
+                else:
+                    # A node created for an out-of-range [n] would not be
+                    # found again by the same step, so it ends the cursor.
+                    stable = target_index == existing + len(new)
+                    plan = [None, {}]
+                    new.append(plan)
+                    if not stable:
+                        continue
+                if len(cursor) == i:
+                    cursor.append((step, plan))
+
+        self._apply_plan(top[1], presorted)
+
+    def _apply_plan(self, keys: dict, presorted: bool):
+        """Materializes one level of an insert_paths plan, children first."""
+        new_nodes = []
+        changed = []
+        for key in (keys if presorted else sorted(keys)):
+            existing, first_node, touched, new = keys[key]
+            for index, (node, (child_tree, child_keys)) in touched.items():
+                if child_tree is None:
+                    child_tree = node.child_tree = HNAVL(nested=True)
+                child_tree._apply_plan(child_keys, presorted)
+                changed.append((key, index))
+            for plan in new:
+                node = Node(key)
+                if plan:
+                    node.child_tree = HNAVL(nested=True)
+                    node.child_tree._apply_plan(plan[1], presorted)
+                    node.total += node.child_tree._total()
+                new_nodes.append(node)
+        self._merge_nodes(new_nodes)
+        # New nodes land after the existing ones, so those keep their index
+        for key, index in changed if self.track_totals else ():
+            self._refresh_totals(self._get_lower_bound(key) + index)
+
+    def merge_sorted(self, keys) -> list:
+        """
+        Adds a sorted run of keys to this level and returns the new Nodes.
+        Small runs are inserted one by one; once the run is large relative
+        to the level, the level is flattened, merged with the run and
+        rebuilt balanced instead. Either way each new key lands after any
+        existing duplicates, exactly as with insert_at_level.
+        Complexity: $O(\\min(k \\log n, n + k))$
+        """
+        self._check_mutable()
+        nodes = [Node(key) for key in keys]
+        for prev, node in zip(nodes, nodes[1:]):
+            if node.key < prev.key:
+                raise ValueError(f"merge_sorted: '{node.key}' arrived after '{prev.key}'")
+        self._merge_nodes(nodes)
+        return nodes
+
+    def _merge_nodes(self, nodes: list):
+        """
+        Adds new nodes, already in key order, to this level. Each one lands
+        after any existing duplicates of its key, as with insert_at_level.
+        """
+        if not nodes:
+            return
+        n = self._get_size(self.root)
+        k = len(nodes)
+        if k * (n + k).bit_length() < self.merge_rebuild_factor * (n + k):
+            for node in nodes:
+                self._insert_node(node)
+            return
+        if n:
+            # heapq.merge is stable: on equal keys, existing nodes come first.
+            nodes = list(heapq.merge(self._inorder_nodes(), nodes, key=attrgetter("key")))
+        self._build_from_sorted(nodes)
+
+    def _inorder_nodes(self) -> list:
+        """All nodes of this level in order, collected without recursion."""
+        nodes = []
+        stack = []
+        curr = self.root
+        while stack or curr:
+            while curr:
+                stack.append(curr)
+                curr = curr.left
+            curr = stack.pop()
+            nodes.append(curr)
+            curr = curr.right
+        return nodes
+
+    def _build_from_sorted(self, nodes: list):
+        """
+        Replaces this level with a balanced tree over `nodes`, which must
+        already be in order. Heights and sizes are set bottom-up.
+        Complexity: $O(n)$
+        """
+        def _build(lo, hi):
+            if lo >= hi:
+                return None
+            mid = (lo + hi) // 2
+            node = nodes[mid]
+            node.left = _build(lo, mid)
+            node.right = _build(mid + 1, hi)
+            self._update_metadata(node)
+            return node
+
+        self.root = _build(0, len(nodes))
+
+    @staticmethod
+    def _compile_query(pattern: str) -> tuple:
+        """
+        Turns a query pattern into one step per segment:
+            ("**",)                         zero or more levels
+            ("literal", key, occurrence)    equal_range (occurrence from a
+                                            following `[n]`, else None = all)
+            ("prefix", prefix, end, glob)   iter_range(prefix, end), then
+                                            fnmatch unless glob is None
+            ("scan", glob)                  every node of the level, fnmatch
+        """
+        steps = []
+        for segment in pattern.strip("/").split("/"):
+            if segment == "**":
+                if not steps or steps[-1] != ("**",):
+                    steps.append(("**",))
+            elif re.fullmatch(r"\[\d+\]", segment) and steps and steps[-1][0] == "literal" and steps[-1][2] is None:
+                steps[-1] = ("literal", steps[-1][1], int(segment[1:-1]))
+            elif not any(c in segment for c in "*?["):
+                steps.append(("literal", segment, None))
+            else:
+                prefix = re.match(r"[^*?[]*", segment).group()
+                if not prefix:
+                    steps.append(("scan", segment))
+                    continue
+                # The smallest string above every string starting with prefix
+                end = prefix.rstrip(chr(sys.maxunicode))
+                end = end[:-1] + chr(ord(end[-1]) + 1) if end else None
+                steps.append(("prefix", prefix, end, None if segment == prefix + "*" else segment))
+        return tuple(steps)
+
+    def _query_level(self, step: tuple):
+        """The nodes of this level that one compiled query step matches."""
+        kind = step[0]
+        if kind == "literal":
+            key, occurrence = step[1], step[2]
+            if occurrence is None:
+                first_rank, count, first_node, target_node = self.equal_range(key)
+                return self.iter_ranks(first_rank, first_rank + count) if count else ()
+            target_node = self.equal_range(key, occurrence)[3]
+            return (target_node,) if target_node else ()
+        if kind == "prefix":
+            nodes = self.iter_range(step[1], step[2])
+            glob = step[3]
+        else:
+            nodes = self.iter_ranks(0)
+            glob = step[-1] if kind == "scan" else None
+        if glob is None:
+            return nodes
+        return (node for node in nodes if fnmatch.fnmatchcase(node.key, glob))
+
+    def query(self, pattern: str):
+        """
+        Lazily yields (full_path, node) for every node whose path matches a
+        glob pattern, in iter_paths order (pre-order), each node once.
+        full_path is spelled as in iter_paths.
+        Segments are matched one level at a time:
+            Search      a literal: every occurrence, found by equal_range
+                        (`Search/[1]` picks one occurrence, as in paths)
+            Delete*     a literal prefix then a glob: only the rank range of
+                        keys starting with the prefix is visited
+            *, ?x, [ab] anything else is fnmatch'ed against the whole level
+            **          zero or more levels, so `a/**` is a and everything
+                        below it
+        Complexity: $O(\\log n)$ per literal or prefix step (plus its
+        matches); `*` and `**` visit every node they pass over.
+        """
+        steps = self._compile_query(pattern)
+        last = len(steps)
+
+        def _from(j):
+            # The steps active from step j on: a `**` may match no level at
+            # all, so the step after it is active as well.
+            return (j, j + 1) if j < last and steps[j] == ("**",) else (j,)
+
+        def _after(i):
+            # The steps left to match below a node that step i matched
+            return _from(i if steps[i] == ("**",) else i + 1)
+
+        def _matches(step, key, occurrence):
+            kind = step[0]
+            if kind == "**":
+                return True
+            if kind == "literal":
+                return key == step[1] and step[2] in (None, occurrence)
+            if kind == "prefix":
+                if not key.startswith(step[1]):
+                    return False
+                return step[3] is None or fnmatch.fnmatchcase(key, step[3])
+            return fnmatch.fnmatchcase(key, step[1])
+
+        def _candidates(level, states, prefix):
+            # (node, full_path, states after it) for the nodes of this level
+            # any of the active steps matches, in rank order
+            if len(states) == 1:
+                i = states[0]
+                for node in level._query_level(steps[i]):
+                    yield node, f"{prefix}/{node.key}" if prefix else node.key, _after(i)
+                return
+            # Several steps are active only below a `**`, which matches every
+            # node anyway: scan the level once and try each step per node,
+            # so a node reached along several routes comes out once.
+            run_key, occurrence = None, 0
+            for node in level.iter_ranks(0):
+                if node.key == run_key:
+                    occurrence += 1
+                else:
+                    run_key, occurrence = node.key, 0
+                after = set()
+                for i in states:
+                    if _matches(steps[i], node.key, occurrence):
+                        after.update(_after(i))
+                if after:
+                    yield node, f"{prefix}/{node.key}" if prefix else node.key, tuple(sorted(after))
+
+        frames = [_candidates(self, tuple(i for i in _from(0) if i < last), "")]
+        while frames:
+            item = next(frames[-1], None)
+            if item is None:
+                frames.pop()
+                continue
+            node, full_path, after = item
+            if after[-1] == last:
+                yield full_path, node
+                after = after[:-1]
+            if after and node.child_tree and node.child_tree.root:
+                frames.append(_candidates(node.child_tree, after, full_path))
+
+    def save(self, path: str):
+        """Writes a binary snapshot of the hierarchy to `path` (see HNAVLib.snapshot)."""
+        from . import snapshot
+        snapshot.save(self, path)
+
+    @staticmethod
+    def open(path: str, mmap: bool = True) -> "HNAVL":
+        """
+        Opens a snapshot written by save. Only the header is read here;
+        levels are served from the mapped file and turned into Nodes lazily.
+        """
+        from . import snapshot
+        return snapshot.load(path, use_mmap=mmap)
+
+    def iter_paths(self, path_prefix: str = "", start: int = 0):
+        """
+        Lazily yields (depth, full_path, node) for the whole hierarchy in the
+        order print_tree shows it: each level in order, every node followed
+        by its nested child_tree. Uses an explicit stack, so arbitrarily deep
+        hierarchies do not hit the recursion limit. `start` skips to that
+        0-based position (see select_path) in $O(depth \\cdot \\log n)$,
+        for resuming a scan from a cursor; that needs track_totals.
+        """
+        for depth, full_path, node, is_last in self._walk(path_prefix, True, start):
+            yield depth, full_path, node
+
+    def iter_lines(self, path_prefix: str = "", is_last: bool = True, parent_prefixes: str = ""):
+        """Lazily yields the lines of print_tree, without trailing newlines."""
+        prefixes = [parent_prefixes]
+        for depth, full_path, node, node_is_last in self._walk(path_prefix, is_last):
+            del prefixes[depth + 1:]
+            prefix = prefixes[depth]
+            marker = "└── " if node_is_last else "├── "
+            yield f"{prefix}{marker}{full_path}"
+            # Add a bar if we aren't at the end; add space if we are
+            prefixes.append(prefix + ("    " if node_is_last else "│   "))
+
+    def _walk(self, path_prefix: str, is_last: bool, start: int = 0):
+        """
+        Pre-order walk over the hierarchy yielding (depth, full_path, node,
+        node_is_last). A frame per open level holds that level's in-order
+        node stack; a node is the last of its level when nothing is left on
+        that stack after its right spine is pushed. A nonzero start begins
+        from the frames _preorder_frames builds.
+        """
+        def _spine(node, stack):
+            while node:
+                stack.append(node)
+                node = node.left
+            return stack
+
+        if start:
+            frames = self._preorder_frames(start, path_prefix, is_last) or []
+        else:
+            frames = [(_spine(self.root, []), path_prefix, 0, is_last)]
+        while frames:
+            stack, prefix, depth, level_is_last = frames[-1]
+            if not stack:
+                frames.pop()
+                continue
+            node = stack.pop()
+            _spine(node.right, stack)
+            full_path = f"{prefix}/{node.key}" if prefix else node.key
+            node_is_last = level_is_last and not stack
+            yield depth, full_path, node, node_is_last
+            # Descend into Nested Child Tree before the rest of this level
+            if node.child_tree and node.child_tree.root:
+                frames.append((_spine(node.child_tree.root, []), full_path, depth + 1, True))
+
+    def print_tree(self, indent: int = 0, path_prefix: str = "", is_last: bool = True, parent_prefixes: str = "", file=None):
+        """
+        Prints the hierarchy with surgical precision using ├── and └──.
+        Maintains in-order traversal and duplicate handling.
+        Lines come from iter_lines and are written to `file` (default
+        sys.stdout) in large chunks rather than one print() per line.
+        """
+        out = file if file is not None else sys.stdout
+        chunk = []
+        for line in self.iter_lines(path_prefix, is_last, parent_prefixes):
+            chunk.append(line)
+            if len(chunk) >= 4096:
+                chunk.append("")
+                out.write("\n".join(chunk))
+                chunk.clear()
+        if chunk:
+            chunk.append("")
+            out.write("\n".join(chunk))
 
+def _build_snapshot(paths: list, presorted: bool) -> bytes:
+    """parallel_build's worker: one chunk of paths, returned as snapshot bytes."""
+    from . import snapshot
+    buf = io.BytesIO()
+    snapshot.write(HNAVL.from_paths(paths, presorted), buf)
+    return buf.getvalue()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# coding=utf-8
+# Copyright (C) 2026 Roy Pfund. All rights reserved.
+#
+# Permission is  hereby  granted,  free  of  charge,  to  any  person
+# obtaining a copy of  this  software  and  associated  documentation
+# files  (the  "Software"),  to  deal   in   the   Software   without
+# restriction, including without limitation the rights to use,  copy,
+# modify, merge, publish, distribute, sublicense, and/or sell  copies
+# of the Software, and to permit persons  to  whom  the  Software  is
+# furnished to do so.
+#
+# The above copyright notice and  this  permission  notice  shall  be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT  WARRANTY  OF  ANY  KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES  OF
+# MERCHANTABILITY,   FITNESS   FOR   A   PARTICULAR    PURPOSE    AND
+# NONINFRINGEMENT.  IN  NO  EVENT  SHALL  THE  AUTHORS  OR  COPYRIGHT
+# OWNER(S) BE LIABLE FOR  ANY  CLAIM,  DAMAGES  OR  OTHER  LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING  FROM,
+# OUT OF OR IN CONNECTION WITH THE  SOFTWARE  OR  THE  USE  OR  OTHER
+# DEALINGS IN THE SOFTWARE.
+######################################################################
+
+# wal.py
+
+import os, struct, tempfile, time, zlib
+
+from . import tree
+from . import snapshot
+
+"""
+
+# Append-only write-ahead log for HNAVL mutations
+
+All integers are little-endian.
+
+    header   magic "HNAVLWAL", u32 version, u32 padding, u64 base sequence
+    records  u32 payload length, u32 CRC-32 (of op, flags and payload),
+             u8 op, u8 flags, then the path as UTF-8
+
+Record i of the file has sequence number base + i. A snapshot records how
+many sequence numbers it already covers, so recovery replays only the
+records at or past that point, whichever of the two files was written last.
+A torn or corrupt record ends the log; it and anything after it are
+truncated on open.
+
+"""
+
+MAGIC = b"HNAVLWAL"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQ")
+RECORD = struct.Struct("<IIBB")
+
+INSERT_PATH = 1
+DELETE_PATH = 2
+RECURSIVE = 1  # DELETE_PATH flag
+
+FSYNC_POLICIES = ("always", "batch", "never")
+
+class WriteAheadLog:
+    """
+    Appends mutation records to a log file.
+
+    Records are buffered in memory and written as one group when
+    `group_size` records are pending or commit() is called. fsync decides
+    when they reach stable storage:
+        "always"  every append is written and fsynced before it returns
+        "batch"   each group is written with a single fsync (group commit)
+        "never"   groups are written but durability is left to the OS
+    On open, the existing records are scanned into `recovered` as
+    (sequence, op, flags, path) tuples for the caller to replay.
+    """
+    def __init__(self, path: str, fsync: str = "batch", group_size: int = 256):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, not {fsync!r}")
+        self.path = path
+        self.fsync = fsync
+        self.group_size = group_size
+        if not os.path.exists(path) or os.path.getsize(path) < HEADER.size:
+            self._create(path, 0)
+        self.base, self.recovered, valid_end = self.scan(path)
+        if valid_end < os.path.getsize(path):
+            with open(path, "r+b") as f:
+                f.truncate(valid_end)
+        self.next_sequence = self.base + len(self.recovered)
+        self._file = open(path, "ab", buffering=0)
+        self._pending = bytearray()
+        self._pending_count = 0
+
+    @staticmethod
+    def _create(path: str, base: int):
+        """Atomically replaces `path` with an empty log starting at `base`."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".hnavl-wal-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, base))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    @staticmethod
+    def scan(path: str) -> tuple:
+        """Returns (base, records, valid_end) for the log at `path`."""
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, pad, base = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not an HNAVL write-ahead log")
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported write-ahead log version {version}")
+        records = []
+        pos = HEADER.size
+        while pos + RECORD.size <= len(data):
+            length, crc, op, flags = RECORD.unpack_from(data, pos)
+            start = pos + RECORD.size
+            payload = data[start:start + length]
+            if len(payload) < length or zlib.crc32(payload, zlib.crc32(bytes((op, flags)))) != crc:
+                break
+            records.append((base + len(records), op, flags, payload.decode("utf-8")))
+            pos = start + length
+        return base, records, pos
+
+    def append(self, op: int, path: str, flags: int = 0):
+        payload = path.encode("utf-8")
+        crc = zlib.crc32(payload, zlib.crc32(bytes((op, flags))))
+        self._pending += RECORD.pack(len(payload), crc, op, flags)
+        self._pending += payload
+        self._pending_count += 1
+        self.next_sequence += 1
+        if self.fsync == "always" or self._pending_count >= self.group_size:
+            self.commit()
+
+    def commit(self):
+        """Writes the pending group (and fsyncs it unless fsync is "never")."""
+        if not self._pending:
+            return
+        self._file.write(self._pending)
+        self._pending.clear()
+        self._pending_count = 0
+        if self.fsync != "never":
+            os.fsync(self._file.fileno())
+
+    def reset(self, base: int):
+        """Starts an empty log at sequence `base`, e.g. after a checkpoint."""
+        self.commit()
+        self._file.close()
+        self._create(self.path, base)
+        self.base = self.next_sequence = base
+        self._file = open(self.path, "ab", buffering=0)
+
+    def close(self):
+        self.commit()
+        self._file.close()
+
+class DurableHNAVL:
+    """
+    An HNAVL hierarchy made durable by a snapshot plus a write-ahead log.
+
+    Opening recovers the latest state: the snapshot (if any) is opened
+    lazily and the log records it does not cover are replayed, runs of
+    inserts in bulk through insert_paths. `recovery` reports how many
+    records were replayed and how fast.
+    Mutations are applied first and logged only if they succeed, so a
+    rejected (e.g. ambiguous) path never reaches the log. Under the
+    "batch"/"never" policies a mutation is durable once commit() returns.
+    checkpoint() folds the log into a fresh snapshot and empties the log.
+    """
+    def __init__(self, snapshot_path: str, wal_path: str, fsync: str = "batch", group_size: int = 256, mmap: bool = True):
+        self.snapshot_path = snapshot_path
+        start = time.perf_counter()
+        if os.path.exists(snapshot_path):
+            self.tree = tree.HNAVL.open(snapshot_path, mmap=mmap)
+            covered = snapshot.read_sequence(snapshot_path)
+        else:
+            self.tree = tree.HNAVL()
+            covered = 0
+        self.wal = WriteAheadLog(wal_path, fsync, group_size)
+        replayed = self._replay(r for r in self.wal.recovered if r[0] >= covered)
+        self.wal.recovered = None
+        if self.wal.next_sequence < covered:
+            # The log is older than the snapshot (e.g. it was lost).
+            self.wal.reset(covered)
+        elapsed = time.perf_counter() - start
+        self.recovery = {
+            "records": replayed,
+            "seconds": elapsed,
+            "records_per_sec": replayed / elapsed if elapsed else 0.0,
+        }
+
+    def _replay(self, records) -> int:
+        count = 0
+        batch = []
+        for sequence, op, flags, path in records:
+            count += 1
+            if op == INSERT_PATH:
+                batch.append(path)
+                continue
+            if batch:
+                self.tree.insert_paths(batch)
+                batch = []
+            if op == DELETE_PATH:
+                self.tree.delete_path(path, recursive=bool(flags & RECURSIVE))
+            else:
+                raise ValueError(f"unknown write-ahead log op {op} at sequence {sequence}")
+        if batch:
+            self.tree.insert_paths(batch)
+        return count
+
+    def insert_path(self, path: str):
+        self.tree.insert_path(path)
+        self.wal.append(INSERT_PATH, path)
+
+    def insert_paths(self, paths):
+        paths = list(paths)
+        self.tree.insert_paths(paths)
+        for path in paths:
+            self.wal.append(INSERT_PATH, path)
+
+    def delete_path(self, path: str, recursive: bool = True) -> tree.Node:
+        removed = self.tree.delete_path(path, recursive)
+        if removed is not None:
+            self.wal.append(DELETE_PATH, path, RECURSIVE if recursive else 0)
+        return removed
+
+    def commit(self):
+        self.wal.commit()
+
+    def checkpoint(self):
+        """Writes a snapshot covering every logged mutation, then empties the log."""
+        self.wal.commit()
+        snapshot.save(self.tree, self.snapshot_path, self.wal.next_sequence)
+        self.wal.reset(self.wal.next_sequence)
+
+    def close(self):
+        self.wal.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
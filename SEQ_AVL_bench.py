@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# coding=utf-8
+# Copyright (C) 2026 Roy Pfund. All rights reserved.
+#
+# Permission is  hereby  granted,  free  of  charge,  to  any  person
+# obtaining a copy of  this  software  and  associated  documentation
+# files  (the  "Software"),  to  deal   in   the   Software   without
+# restriction, including without limitation the rights to use,  copy,
+# modify, merge, publish, distribute, sublicense, and/or sell  copies
+# of the Software, and to permit persons  to  whom  the  Software  is
+# furnished to do so.
+#
+# The above copyright notice and  this  permission  notice  shall  be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT  WARRANTY  OF  ANY  KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES  OF
+# MERCHANTABILITY,   FITNESS   FOR   A   PARTICULAR    PURPOSE    AND
+# NONINFRINGEMENT.  IN  NO  EVENT  SHALL  THE  AUTHORS  OR  COPYRIGHT
+# OWNER(S) BE LIABLE FOR  ANY  CLAIM,  DAMAGES  OR  OTHER  LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING  FROM,
+# OUT OF OR IN CONNECTION WITH THE  SOFTWARE  OR  THE  USE  OR  OTHER
+# DEALINGS IN THE SOFTWARE.
+######################################################################
+
+# SEQ_AVL_bench.py
+# benchmarks for SEQ_AVL, run with e.g. `python3 SEQ_AVL_bench.py ranges --max-exp 6`
+
+import subprocess, threading, re, os, sys, inspect, shutil, argparse, random, math, fnmatch, json, types
+import time, tracemalloc
+
+from SEQ_AVL_test import SEQ_AVL, PACKED_SEQ_AVL, int32, uint8, affine, xor
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+def recursive_inorder(t, func):
+    """SEQ_AVL.inorder as it was before the iterators: a recursive closure."""
+    def _inorder(node):
+        if node:
+            t._push(node)
+            _inorder(node.left)
+            func(node.key)
+            _inorder(node.right)
+    _inorder(t.root)
+
+def rand_text(n: int, seed: int = 42):
+    """n code points of printable ASCII."""
+    rng = random.Random(seed)
+    return [rng.randrange(0x20, 0x7F) for _ in range(n)]
+
+def loaded(n: int) -> SEQ_AVL:
+    t = SEQ_AVL(cast_fn=int32)
+    t.insert_range(0, rand_text(n))
+    return t
+
+def bench_ranges(max_exp: int = 6):
+    """Splicing a run of k code points into / out of a sequence of n: per-element loop vs ListOps."""
+    print("=== ranges: seconds to insert / delete a run of k elements in a sequence of n ===")
+    print(f"{'n':>10} {'k':>8} {'ins loop':>9} {'ins range':>10} {'del loop':>9} {'del range':>10} {'concat':>9}")
+    for exp in range(3, max_exp + 1):
+        n = 10 ** exp
+        for k in sorted({10, 1000, n // 10}):
+            run = rand_text(k, seed=k)
+            t = loaded(n)
+            ins_loop, _ = timed(lambda: [t.insert(n // 2 + i, key) for i, key in enumerate(run)])
+            del_loop, _ = timed(lambda: [t.delete(n // 2) for _ in run])
+            ins_range, _ = timed(t.insert_range, n // 2, run)
+            del_range, _ = timed(t.delete_range, n // 2, n // 2 + k)
+            other = loaded(k)
+            concat, _ = timed(t.concat, other)
+            print(f"{n:>10} {k:>8} {ins_loop:>9.5f} {ins_range:>10.5f} {del_loop:>9.5f} {del_range:>10.5f} {concat:>9.6f}")
+
+def bench_lazy(max_exp: int = 6):
+    """reverse/apply on random slices: eager rebuild of the slice vs lazy tags."""
+    print("=== lazy: microseconds per reverse / apply of a random slice ===")
+    print(f"{'n':>10} {'eager rev':>10} {'lazy rev':>10} {'eager upd':>10} {'lazy upd':>10} {'search':>8}")
+    for exp in range(3, max_exp + 1):
+        n = 10 ** exp
+        t = loaded(n)
+        rng = random.Random(exp)
+        slices = [sorted((rng.randrange(n), rng.randrange(n))) for _ in range(200)]
+        reps = 5 if n >= 10 ** 6 else 50
+        def eager(transform):
+            for i, j in slices[:reps]:
+                run = t.delete_range(i, j)
+                keys = []
+                run.inorder(keys.append)
+                t.insert_range(i, transform(keys))
+        eager_rev, _ = timed(eager, lambda keys: keys[::-1])
+        eager_upd, _ = timed(eager, lambda keys: [3 * k + 7 for k in keys])
+        lazy_rev, _ = timed(lambda: [t.reverse(i, j) for i, j in slices])
+        lazy_upd, _ = timed(lambda: [t.apply(i, j, affine(3, 7) if i & 1 else xor(0x20)) for i, j in slices])
+        # reads pay for pushing the tags they pass
+        search, _ = timed(lambda: [t.search(rng.randrange(n)) for _ in range(1000)])
+        print(f"{n:>10} {eager_rev / reps * 1e6:>10.1f} {lazy_rev / len(slices) * 1e6:>10.1f} "
+              f"{eager_upd / reps * 1e6:>10.1f} {lazy_upd / len(slices) * 1e6:>10.1f} {search / 1000 * 1e6:>8.1f}")
+
+def bench_packed(max_exp: int = 7):
+    """
+    Memory and random insert/delete throughput, SEQ_AVL vs PACKED_SEQ_AVL,
+    on the test_int32_sequence / test_uint8_sequence workloads (random keys
+    inserted at random positions, then 80% as many random deletes).
+    One Python object per element caps plain SEQ_AVL at 10^6 here.
+    """
+    print("=== packed: bytes/element and random insert+delete ops/sec ===")
+    print(f"{'n':>10} {'type':>6} {'variant':>10} {'B/elem':>8} {'ops/s':>10} {'search µs':>10}")
+    for exp in range(3, max_exp + 1):
+        n = 10 ** exp
+        for cast_fn, alphabet in ((int32, list(range(0x30, 0x3A)) + list(range(0x41, 0x47))), (uint8, range(0, 255))):
+            rng = random.Random(exp)
+            keys = [rng.choice(alphabet) for _ in range(n)]
+            variants = [("packed", lambda: PACKED_SEQ_AVL(cast_fn))]
+            if exp <= 6:
+                variants.insert(0, ("plain", lambda: SEQ_AVL(cast_fn)))
+            for name, make in variants:
+                tracemalloc.start()
+                before = tracemalloc.get_traced_memory()[0]
+                t = make()
+                t.insert_range(0, keys)
+                used = tracemalloc.get_traced_memory()[0] - before
+                tracemalloc.stop()
+                ops = min(n, 10 ** 5)
+                inserts = [(rng.randint(0, n + i), rng.choice(alphabet)) for i in range(ops)]
+                deletes = [rng.randrange(n + ops - i) for i in range(ops * 4 // 5)]
+                churn, _ = timed(lambda: ([t.insert(i, k) for i, k in inserts], [t.delete(i) for i in deletes]))
+                probes = [rng.randrange(n) for _ in range(10 ** 4)]
+                search, _ = timed(lambda: [t.search(i) for i in probes])
+                type_name = "int32" if cast_fn is int32 else "uint8"
+                print(f"{n:>10} {type_name:>6} {name:>10} {used / n:>8.1f} {(len(inserts) + len(deletes)) / churn:>10.0f} {search / len(probes) * 1e6:>10.2f}")
+                del t
+
+def bench_export(max_exp: int = 7):
+    """MB/s getting a sequence out as bytes: inorder callback vs iter_chunks / to_bytes / readinto."""
+    print("=== export: MB/s of payload copied out of a sequence of n elements ===")
+    print(f"{'n':>10} {'type':>6} {'variant':>8} {'callback':>9} {'chunks':>9} {'to_bytes':>9} {'readinto':>9}")
+    for exp in range(4, max_exp + 1):
+        n = 10 ** exp
+        for cast_fn in (int32, uint8):
+            keys = rand_text(n)
+            variants = [("packed", PACKED_SEQ_AVL(cast_fn))]
+            if exp <= 6:
+                variants.insert(0, ("plain", SEQ_AVL(cast_fn)))
+            for name, t in variants:
+                t.insert_range(0, keys)
+                payload = len(t.to_bytes())
+                def callback():
+                    out = t._new_buffer()
+                    t.inorder(out.append)
+                    return out
+                def chunks():
+                    sink = open(os.devnull, "wb")
+                    for view in t.iter_chunks():
+                        sink.write(view)
+                    sink.close()
+                buf = bytearray(payload)
+                rates = [payload / 1e6 / timed(fn)[0] for fn in (callback, chunks, t.to_bytes, lambda: t.readinto(buf))]
+                type_name = "int32" if cast_fn is int32 else "uint8"
+                print(f"{n:>10} {type_name:>6} {name:>8} " + " ".join(f"{r:>9.1f}" for r in rates))
+                del t
+
+def bench_iter(max_exp: int = 6):
+    """Per-element cost of a full traversal: recursive callback vs the iterators, plus iter_from's start cost."""
+    print("=== iter: ns per element of a full in-order traversal ===")
+    print(f"{'n':>10} {'recursive':>10} {'inorder':>10} {'for':>10} {'reversed':>10} {'packed for':>11} {'iter_from µs':>13}")
+    for exp in range(3, max_exp + 1):
+        n = 10 ** exp
+        t = loaded(n)
+        packed = PACKED_SEQ_AVL(int32)
+        packed.insert_range(0, rand_text(n))
+        sink = []
+        def consume(it):
+            for key in it:
+                pass
+        costs = [timed(fn)[0] / n * 1e9 for fn in (
+            lambda: recursive_inorder(t, sink.append),
+            lambda: t.inorder(sink.append),
+            lambda: consume(t),
+            lambda: consume(reversed(t)),
+            lambda: consume(packed))]
+        sink.clear()
+        # Starting mid-sequence costs one descent, not a skip over n/2 elements
+        start, _ = timed(lambda: [next(t.iter_from(i)) for i in range(0, n, max(1, n // 1000))])
+        print(f"{n:>10} " + " ".join(f"{c:>10.1f}" for c in costs[:4]) + f" {costs[4]:>11.1f} {start / min(n, 1000) * 1e6:>13.2f}")
+
+BENCHMARKS = {
+    "ranges": bench_ranges,
+    "lazy": bench_lazy,
+    "packed": bench_packed,
+    "export": bench_export,
+    "iter": bench_iter,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="SEQ_AVL benchmarks")
+    parser.add_argument("names", nargs="*", default=list(BENCHMARKS), help=f"any of {', '.join(BENCHMARKS)}")
+    parser.add_argument("--max-exp", type=int, default=5, help="largest problem size as a power of ten")
+    args = parser.parse_args()
+    for name in args.names:
+        BENCHMARKS[name](args.max_exp)
+        print()
+
+if __name__ == "__main__":
+    main()
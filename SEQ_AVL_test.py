@@ -26,6 +26,8 @@
 # sequential AVL tree
 
 import subprocess, threading, re, os, sys, inspect, shutil, argparse, random, math, fnmatch, json, types
+import itertools
+from array import array
 
 def int32(x: int) -> int:
     x &= 0xFFFFFFFF
@@ -61,6 +63,300 @@ def test_uint8_sequence():
     print(f"Final Sequence (uint8 hex): ", end='')
     t.inorder(lambda k: print(f"{k & 0xFF:02X}", end=' '))
 
+def check_seq(t):
+    """Verifies heights, sizes and the AVL balance of every node; returns the keys in order."""
+    keys = []
+    def _check(node):
+        if not node:
+            return 0, 0
+        t._push(node)
+        hl, sl = _check(node.left)
+        keys.append(node.key)
+        hr, sr = _check(node.right)
+        assert abs(hl - hr) <= 1
+        assert node.height == 1 + max(hl, hr) and node.size == 1 + sl + sr
+        return node.height, node.size
+    _check(t.root)
+    return keys
+
+def test_list_ops():
+    rng = random.Random(21)
+    t = SEQ_AVL(cast_fn=uint8)
+    t.insert_range(0, range(300))
+    model = [uint8(k) for k in range(300)]
+    assert check_seq(t) == model
+    for step in range(400):
+        op = rng.randrange(4)
+        i = rng.randint(-5, len(model) + 5)
+        j = rng.randint(-5, len(model) + 5)
+        if op == 0:
+            run = [rng.randrange(1000) for _ in range(rng.randrange(40))]
+            t.insert_range(i, run)
+            i = max(0, min(i, len(model)))
+            model[i:i] = [uint8(k) for k in run]
+        elif op == 1:
+            removed = t.delete_range(i, j)
+            i = max(0, i)
+            assert check_seq(removed) == model[i:max(i, j)]
+            del model[i:max(i, j)]
+        elif op == 2:
+            rest = t.split(i)
+            assert check_seq(rest) == model[max(0, i):]
+            t.concat(rest)
+            assert rest.root is None
+        else:
+            right = t.split(i)
+            middle = rng.randrange(256)
+            t = SEQ_AVL.join(t, middle, right)
+            i = max(0, min(i, len(model)))
+            model[i:i] = [middle]
+        assert check_seq(t) == model
+
+    # Joining trees of very different heights stays balanced
+    small, big = SEQ_AVL(), SEQ_AVL()
+    small.insert_range(0, "ab")
+    big.insert_range(0, "x" * 5000)
+    big.concat(small)
+    small.insert_range(0, "cd")
+    small.concat(big)
+    assert "".join(check_seq(small)) == "cd" + "x" * 5000 + "ab"
+
+def test_lazy_tags():
+    rng = random.Random(22)
+    t = SEQ_AVL(cast_fn=int32)
+    t.insert_range(0, range(500))
+    model = list(range(500))
+    updates = [affine(3, 7), affine(-1), affine(1, 1 << 31), xor(0x5A5A), xor(-1)]
+    for step in range(600):
+        i = rng.randint(-5, len(model) + 5)
+        j = rng.randint(-5, len(model) + 5)
+        lo, hi = max(0, min(i, len(model))), max(0, min(j, len(model)))
+        op = rng.randrange(6)
+        if op == 0:
+            t.reverse(i, j)
+            model[lo:max(lo, hi)] = model[lo:max(lo, hi)][::-1]
+        elif op == 1:
+            update = rng.choice(updates)
+            t.apply(i, j, update)
+            model[lo:max(lo, hi)] = [int32(run_update(update, k)) for k in model[lo:max(lo, hi)]]
+        elif op == 2:
+            key = rng.randrange(1000)
+            t.insert(i, key)
+            model.insert(lo, key)
+        elif op == 3 and model:
+            t.delete(lo % len(model))
+            del model[lo % len(model)]
+        elif op == 4 and model:
+            assert t.search(lo % len(model)).key == model[lo % len(model)]
+        else:
+            removed = t.delete_range(i, j)
+            t.insert_range(lo, check_seq(removed))
+        if step % 50 == 0:
+            assert check_seq(t) == model
+    assert check_seq(t) == model
+    out = []
+    t.inorder(out.append)
+    assert out == model
+
+    # Pending tags stay one step with reduced coefficients, however many
+    # (and whatever mix of) updates are stacked on an untouched node
+    for cast_fn in (int32, uint8):
+        t = SEQ_AVL(cast_fn)
+        t.insert_range(0, range(1000))
+        model = [cast_fn(k) for k in range(1000)]
+        for step in range(300):
+            update = affine(3, 7) if step % 2 else xor(0x5A5A5A5A)
+            t.apply(0, 1000, update)
+            model = [cast_fn(run_update(update, k)) for k in model]
+        mask = SEQ_AVL.MASKS[cast_fn]
+        def _tags(node):
+            return _tags(node.left) + [node.tag] + _tags(node.right) if node else []
+        for tag in _tags(t.root):
+            assert tag is None or len(tag) <= SEQ_AVL.max_tag_steps and all(0 <= c <= mask for c in tag[0][1:] if isinstance(c, int))
+        assert check_seq(t) == model
+
+    assert compose_updates(affine(2, 1), affine(3, 4)) == affine(6, 7)
+    assert compose_updates(affine(3, 7), affine(3, 7), 0xFF) == affine(9, 28)
+    assert compose_updates(affine(1 << 20, 0), affine(1 << 20, 0), 0xFFFFFFFF) == affine(0, 0)
+    assert compose_updates(xor(3), xor(5)) == xor(6)
+    assert len(compose_updates(compose_updates(affine(2), xor(1)), xor(2))) == 2
+
+def check_packed(t):
+    """check_seq for PACKED_SEQ_AVL: also checks chunk fill; returns the elements in order."""
+    chunks = []
+    def _check(node):
+        if not node:
+            return 0, 0
+        t._push(node)
+        hl, sl = _check(node.left)
+        assert 0 < len(node.key) <= t.chunk and isinstance(node.key, type(t._new_chunk()))
+        chunks.append(node.key)
+        hr, sr = _check(node.right)
+        assert abs(hl - hr) <= 1
+        assert node.height == 1 + max(hl, hr) and node.size == len(node.key) + sl + sr
+        return node.height, node.size
+    _check(t.root)
+    return [k for c in chunks for k in c]
+
+def test_packed_sequence():
+    for cast_fn in (int32, uint8):
+        rng = random.Random(23)
+        t = PACKED_SEQ_AVL(cast_fn, chunk=8)
+        model = []
+        for step in range(3000):
+            op = rng.randrange(10)
+            i = rng.randint(-2, len(model) + 2)
+            lo = max(0, min(i, len(model)))
+            if op < 4 or not model:
+                key = rng.randrange(-300, 300)
+                t.insert(i, key)
+                model.insert(lo, cast_fn(key))
+            elif op < 7:
+                t.delete(lo % len(model))
+                del model[lo % len(model)]
+            elif op == 7:
+                assert t.search(lo % len(model)) == model[lo % len(model)]
+            elif op == 8:
+                j = rng.randint(-2, len(model) + 2)
+                hi = max(lo, min(j, len(model)))
+                if rng.random() < 0.5:
+                    t.reverse(i, j)
+                    model[lo:hi] = model[lo:hi][::-1]
+                else:
+                    t.apply(i, j, xor(0x21))
+                    model[lo:hi] = [cast_fn(k ^ 0x21) for k in model[lo:hi]]
+            else:
+                run = [rng.randrange(256) for _ in range(rng.randrange(30))]
+                t.insert_range(i, run)
+                model[lo:lo] = [cast_fn(k) for k in run]
+                removed = t.delete_range(lo + 3, lo + 20)
+                assert check_packed(removed) == model[lo + 3:lo + 20]
+                del model[lo + 3:lo + 20]
+            if step % 100 == 0:
+                assert check_packed(t) == model
+        assert check_packed(t) == model
+        out = []
+        t.inorder(out.append)
+        assert out == model
+        assert t.search(len(model)) is None and t.search(-1) is None
+    # Range operations rejoin the chunks they cut, so the fill holds up
+    t = PACKED_SEQ_AVL(uint8, chunk=16)
+    t.insert_range(0, range(3000))
+    model = [uint8(k) for k in range(3000)]
+    for step in range(2000):
+        i, j = sorted((rng.randrange(3000), rng.randrange(3000)))
+        if step % 3 == 0:
+            t.reverse(i, j)
+            model[i:j] = model[i:j][::-1]
+        elif step % 3 == 1:
+            t.apply(i, j, xor(step))
+            model[i:j] = [uint8(k ^ step) for k in model[i:j]]
+        else:
+            run = check_packed(t.delete_range(i, j))
+            t.insert_range(i, run)
+    chunks = sum(1 for node in t._iter_nodes())
+    assert check_packed(t) == model and 3000 / chunks >= t.chunk / 2
+
+    # Deleting down merges sparse chunks back together
+    t = PACKED_SEQ_AVL(uint8, chunk=16)
+    t.insert_range(0, range(1600))
+    for i in range(1500):
+        t.delete(rng.randrange(t._size(t.root)))
+    assert len(check_packed(t)) == 100 and t.root.height <= 5
+
+def test_buffer_export():
+    rng = random.Random(24)
+    for cast_fn, typed in ((int32, lambda keys: array("i", keys).tobytes()), (uint8, bytes)):
+        keys = [cast_fn(rng.randrange(-1000, 1000)) for _ in range(3000)]
+        for t in (SEQ_AVL(cast_fn), PACKED_SEQ_AVL(cast_fn, chunk=64)):
+            t.insert_range(0, keys)
+            t.reverse(100, 900)
+            model = keys[:100] + keys[100:900][::-1] + keys[900:]
+            assert t.to_bytes() == typed(model)
+            for start, stop in ((0, 1), (5, 5), (63, 1000), (2999, None), (-4, 70), (2000, 9999)):
+                lo, hi = max(0, start), len(model) if stop is None else min(stop, len(model))
+                expected = typed(model[lo:max(lo, hi)])
+                assert t.to_bytes(start, stop) == expected
+                assert b"".join(t.iter_chunks(start, stop, **({"batch": 7} if type(t) is SEQ_AVL else {}))) == expected
+                buf = bytearray(len(expected) + 8)
+                assert t.readinto(buf, start, stop) == len(expected) and buf[:len(expected)] == expected
+            # A short buffer takes whole elements only
+            short = bytearray(10)
+            written = t.readinto(short, 50)
+            assert written == 10 // len(typed(keys[:1])) * len(typed(keys[:1]))
+            assert short[:written] == typed(model[50:])[:written]
+    # Views alias the packed chunks
+    t = PACKED_SEQ_AVL(uint8)
+    t.insert_range(0, b"hello")
+    view = next(t.iter_chunks())
+    t.apply(0, 5, xor(0x20))
+    assert bytes(view) == b"HELLO"
+    del view
+    t.insert(5, ord("!"))
+    assert t.to_bytes() == b"HELLO!"
+
+    # Range operations cut chunks into new buffers, so they work while
+    # views are held
+    for cast_fn in (uint8, int32):
+        p = PACKED_SEQ_AVL(cast_fn, chunk=16)
+        p.insert_range(0, range(200))
+        model = [cast_fn(k) for k in range(200)]
+        views = list(p.iter_chunks(100, 101)) + list(p.iter_chunks(7, 40))
+        p.reverse(10, 105)
+        model[10:105] = model[10:105][::-1]
+        removed = p.delete_range(3, 50)
+        assert check_packed(removed) == model[3:50]
+        del model[3:50]
+        p.insert_range(60, range(30))
+        model[60:60] = [cast_fn(k) for k in range(30)]
+        model += check_packed(removed)
+        p.concat(removed)
+        assert check_packed(p) == model
+        del views
+    try:
+        SEQ_AVL().to_bytes()
+        assert False, "untyped sequence exported"
+    except ValueError:
+        pass
+
+def test_iterators():
+    rng = random.Random(25)
+    keys = [rng.randrange(256) for _ in range(2000)]
+    for t in (SEQ_AVL(uint8), PACKED_SEQ_AVL(uint8, chunk=32)):
+        t.insert_range(0, keys)
+        t.reverse(300, 1700)
+        t.apply(0, 1000, affine(3, 1))
+        model = [uint8(3 * k + 1) for k in keys[:300]] + keys[300:1700][::-1] + keys[1700:]
+        model[300:1000] = [uint8(3 * k + 1) for k in model[300:1000]]
+        assert list(t) == model and list(reversed(t)) == model[::-1]
+        for i in (-3, 0, 1, 31, 32, 999, 1999, 2000, 2500):
+            assert list(t.iter_from(i)) == model[max(i, 0):]
+            assert list(t.iter_from(i, reverse=True)) == (model[:min(i, 1999) + 1][::-1] if i >= 0 else [])
+        # Paused iterators and zip
+        it = t.iter_from(10)
+        head = list(itertools.islice(it, 5))
+        assert head + list(itertools.islice(it, 5)) == model[10:20]
+        assert all(a == b for a, b in zip(t, reversed(model[::-1])))
+    assert list(SEQ_AVL()) == [] and list(reversed(SEQ_AVL())) == []
+
+    # Deep enough to overflow the old recursive traversals
+    t = SEQ_AVL()
+    t.insert(0, 0)
+    node = t.root
+    for i in range(1, 5000):
+        node.right = SEQ_AVL.Node(i)
+        node = node.right
+    size = 5000
+    node = t.root
+    while node:
+        node.size = size
+        size -= 1
+        node = node.right
+    out = []
+    t.inorder(out.append)
+    assert out == list(range(5000)) and list(t.iter_from(4990)) == list(range(4990, 5000))
+    assert sum(1 for _ in t.iter_preorder()) == 5000
+
 def main():
     test_int32_sequence()
     test_uint8_sequence()
@@ -91,6 +387,14 @@ def main():
 ######################################################################
 
 class SEQ_AVL:
+    # cast_fn -> the typed buffer its elements pack into (to_bytes etc.)
+    TYPES = {int32: lambda: array("i"), uint8: bytearray}
+    # cast_fn -> 2^w - 1, for keeping lazy update coefficients reduced
+    MASKS = {int32: 0xFFFFFFFF, uint8: 0xFF}
+
+    # Longest pending tag (in steps of alternating kinds) a node may hold
+    max_tag_steps = 32
+
     def __init__(self, cast_fn=None):
         """
         cast_fn: optional function applied to every key on node creation.
@@ -107,6 +411,11 @@ class SEQ_AVL:
             self.right = None
             self.height = 1
             self.size = 1
+            # Lazy tags, already applied to this node and pending for its
+            # children: rev means their subtrees still have to be mirrored,
+            # tag is an update (see affine/xor) they have not received yet.
+            self.rev = False
+            self.tag = None
 
     def _height(self, n):
         return 0 if not n else n.height
@@ -114,6 +423,42 @@ class SEQ_AVL:
     def _size(self, n):
         return 0 if not n else n.size
 
+    def _apply_rev(self, n):
+        """Reverses the subtree at n: swaps its children now, theirs later."""
+        if n:
+            n.left, n.right = n.right, n.left
+            n.rev = not n.rev
+
+    def _apply_tag(self, n, update):
+        """
+        Applies an update to the subtree at n: its own key now, the rest
+        later. If the pending tag would grow past max_tag_steps, it is
+        pushed to the children first.
+        """
+        if n:
+            key = run_update(update, n.key)
+            n.key = self.cast_fn(key) if self.cast_fn else key
+            n.tag = self._stack_tag(n, update)
+
+    def _stack_tag(self, n, update):
+        """n.tag followed by update, pushing n.tag down first if that gets too long."""
+        tag = compose_updates(n.tag, update, self.MASKS.get(self.cast_fn))
+        if len(tag) > self.max_tag_steps and n.tag:
+            self._push(n)
+            tag = update
+        return tag
+
+    def _push(self, n):
+        """Hands n's pending tags down to its children; call before descending or relinking."""
+        if n.rev:
+            self._apply_rev(n.left)
+            self._apply_rev(n.right)
+            n.rev = False
+        if n.tag:
+            self._apply_tag(n.left, n.tag)
+            self._apply_tag(n.right, n.tag)
+            n.tag = None
+
     def _update(self, n):
         if not n:
             return None
@@ -125,6 +470,8 @@ class SEQ_AVL:
         def _balance(n):
             return self._height(n.left) - self._height(n.right) if n else 0
         def rotate_left(x):
+            self._push(x)
+            self._push(x.right)
             y = x.right
             x.right = y.left
             y.left = x
@@ -132,6 +479,8 @@ class SEQ_AVL:
             self._update(y)
             return y
         def rotate_right(y):
+            self._push(y)
+            self._push(y.left)
             x = y.left
             y.left = x.right
             x.right = y
@@ -155,6 +504,7 @@ class SEQ_AVL:
         node = self.root
         curr_idx = index
         while node:
+            self._push(node)
             left_size = self._size(node.left)
             if curr_idx < left_size:
                 node = node.left
@@ -169,6 +519,7 @@ class SEQ_AVL:
         def _insert_at_index(node, index, key):
             if not node:
                 return SEQ_AVL.Node(key, self.cast_fn)
+            self._push(node)
             left_size = self._size(node.left)
             if index <= left_size:
                 node.left = _insert_at_index(node.left, index, key)
@@ -185,6 +536,7 @@ class SEQ_AVL:
         def _delete_at_index(node, idx):
             if not node:
                 return None
+            self._push(node)
             left_size = self._size(node.left)
             if idx < left_size:
                 node.left = _delete_at_index(node.left, idx)
@@ -196,8 +548,10 @@ class SEQ_AVL:
                 if not node.right:
                     return node.left
                 succ = node.right
+                self._push(succ)
                 while succ.left:
                     succ = succ.left
+                    self._push(succ)
                 node.key = succ.key
                 node.right = _delete_at_index(node.right, 0)
             self._update(node)
@@ -206,35 +560,623 @@ class SEQ_AVL:
             self.root = _delete_at_index(self.root, index)
         return self.root
 
+    ## ListOps: Concat, InsertRange, DeleteRange
+
+    # Built on an AVL join: the taller tree is descended along its inner
+    # spine to the height of the shorter one, the pivot is linked in there
+    # and the spine is rebalanced on the way back up. That costs
+    # O(|height difference| + 1), so split/concat stay O(log n).
+
+    def _join(self, left, pivot, right):
+        """Links left + [pivot] + right (node roots) into one tree, returns its root."""
+        hl, hr = self._height(left), self._height(right)
+        if hl > hr + 1:
+            self._push(left)
+            left.right = self._join(left.right, pivot, right)
+            self._update(left)
+            return self._rebalance(left)
+        if hr > hl + 1:
+            self._push(right)
+            right.left = self._join(left, pivot, right.left)
+            self._update(right)
+            return self._rebalance(right)
+        pivot.left, pivot.right = left, right
+        return self._update(pivot)
+
+    def _pop_first(self, node):
+        """Detaches the first node of a subtree; returns (rest, first)."""
+        self._push(node)
+        if not node.left:
+            rest = node.right
+            node.right = None
+            return rest, self._update(node)
+        node.left, first = self._pop_first(node.left)
+        self._update(node)
+        return self._rebalance(node), first
+
+    def _join2(self, left, right):
+        """Links left + right (node roots) into one tree, returns its root."""
+        if not left:
+            return right
+        if not right:
+            return left
+        rest, first = self._pop_first(right)
+        return self._join(left, first, rest)
+
+    def _split(self, node, index):
+        """Splits a subtree into (first index elements, the rest), as node roots."""
+        if not node:
+            return None, None
+        self._push(node)
+        left_size = self._size(node.left)
+        if index <= left_size:
+            left, right = self._split(node.left, index)
+            return left, self._join(right, node, node.right)
+        left, right = self._split(node.right, index - left_size - 1)
+        return self._join(node.left, node, left), right
+
+    def _build(self, keys):
+        """A perfectly balanced tree over a list of keys, in O(k)."""
+        def _build_range(lo, hi):
+            if lo >= hi:
+                return None
+            mid = (lo + hi) // 2
+            node = SEQ_AVL.Node(keys[mid], self.cast_fn)
+            node.left = _build_range(lo, mid)
+            node.right = _build_range(mid + 1, hi)
+            return self._update(node)
+        return _build_range(0, len(keys))
+
+    def _wrap(self, root):
+        """A new SEQ_AVL with the same cast_fn around an existing node root."""
+        t = SEQ_AVL(self.cast_fn)
+        t.root = root
+        return t
+
+    @classmethod
+    def join(cls, left, pivot, right):
+        """
+        Returns left + [pivot] + right as a new SEQ_AVL (with left's cast_fn).
+        left and right are consumed: their nodes move into the result and
+        both are left empty. O(log n).
+        """
+        t = cls(left.cast_fn)
+        t.root = t._join(left.root, SEQ_AVL.Node(pivot, t.cast_fn), right.root)
+        left.root = right.root = None
+        return t
+
+    def split(self, index: int):
+        """
+        Keeps the first `index` elements and returns the rest as a new
+        SEQ_AVL. index is clamped to 0..size, like insert. O(log n).
+        """
+        index = max(0, min(index, self._size(self.root)))
+        self.root, rest = self._split(self.root, index)
+        return self._wrap(rest)
+
+    def concat(self, other):
+        """Appends other's elements, leaving other empty. O(log n)."""
+        if other is self:
+            raise ValueError("cannot concat a sequence with itself")
+        self.root = self._join2(self.root, other.root)
+        other.root = None
+        return self.root
+
+    def insert_range(self, index: int, keys):
+        """
+        Inserts the keys of an iterable before index (clamped like insert),
+        in order. O(k) to build the run plus O(log n) to splice it in.
+        """
+        run = self._build(list(keys))
+        if not run:
+            return self.root
+        index = max(0, min(index, self._size(self.root)))
+        left, right = self._split(self.root, index)
+        self.root = self._join2(self._join2(left, run), right)
+        return self.root
+
+    def delete_range(self, i: int, j: int):
+        """
+        Removes the elements at indices i <= index < j (clamped, like a
+        slice) and returns them as a new SEQ_AVL. O(log n).
+        """
+        size = self._size(self.root)
+        i = max(0, min(i, size))
+        j = max(i, min(j, size))
+        left, rest = self._split(self.root, i)
+        removed, right = self._split(rest, j - i)
+        self.root = self._join2(left, right)
+        return self._wrap(removed)
+
+    ## ListOps: Reverse, Update
+
+    # The range is split out, tagged at its root and joined back, so both
+    # run in O(log n); the tags travel down only as later operations
+    # descend (_push).
+
+    def _tag_range(self, i: int, j: int, tag_fn):
+        size = self._size(self.root)
+        i = max(0, min(i, size))
+        j = max(i, min(j, size))
+        left, rest = self._split(self.root, i)
+        middle, right = self._split(rest, j - i)
+        tag_fn(middle)
+        self.root = self._join2(self._join2(left, middle), right)
+        return self.root
+
+    def reverse(self, i: int, j: int):
+        """Reverses the elements at indices i <= index < j (clamped, like a slice)."""
+        return self._tag_range(i, j, self._apply_rev)
+
+    def apply(self, i: int, j: int, update):
+        """
+        Replaces every element k at indices i <= index < j (clamped, like a
+        slice) by cast_fn(update(k)), for an update built with affine()
+        and/or xor() (or compose_updates of them).
+        """
+        if self.cast_fn is uint8:
+            update = byte_table(update)
+        return self._tag_range(i, j, lambda n: self._apply_tag(n, update))
+
+    ## Traversal
+
+    # Generators with an explicit stack: they can be paused, sliced
+    # (itertools.islice) and zipped, and deep trees cannot hit the
+    # recursion limit. The sequence must not be changed while one is
+    # suspended.
+
+    def __iter__(self):
+        return self.iter_from(0)
+
+    def __reversed__(self):
+        return self.iter_from(self._size(self.root) - 1, reverse=True)
+
+    def iter_from(self, index: int, reverse: bool = False):
+        """
+        Yields the elements from index to the end, or down to the start if
+        reverse. One O(log n) descent to index, then O(1) amortized per
+        element.
+        """
+        size = self._size(self.root)
+        index = min(index, size - 1) if reverse else max(index, 0)
+        if 0 <= index < size:
+            for node, offset in self._iter_nodes(index, reverse):
+                yield node.key
+
+    def iter_preorder(self):
+        """Yields (node, prefix, is_last) in preorder, the structural context preorder passes on."""
+        stack = [(self.root, "", True)] if self.root else []
+        while stack:
+            node, prefix, is_last = stack.pop()
+            self._push(node)
+            yield node, prefix, is_last
+            # Calculate the prefix for the next level
+            new_prefix = prefix + ("    " if is_last else "│   ")
+            # Right is always 'last' in a binary tree preorder; left is
+            # 'last' only if there is no right sibling. Right goes on the
+            # stack first so that left comes out first.
+            if node.right:
+                stack.append((node.right, new_prefix, True))
+            if node.left:
+                stack.append((node.left, new_prefix, not node.right))
+
     def inorder(self, func):
         """In-order traversal: applies the provided function (e.g. printchar)
         to each key in sequence order (left-key-right)."""
-        def _inorder(node):
-            if node:
-                _inorder(node.left)
-                func(node.key)
-                _inorder(node.right)
-        _inorder(self.root)
+        for key in self:
+            func(key)
 
     def preorder(self, func):
         """General preorder traversal that provides structural metadata to the callback."""
-        def _visit(node, prefix, is_last):
-            if not node:
-                return
-            # Pass the node and its structural context to the callback
+        for node, prefix, is_last in self.iter_preorder():
             func(node, prefix, is_last)
-            # Calculate the prefix for the next level
-            new_prefix = prefix + ("    " if is_last else "│   ")
-            # Determine children and which one is 'last'
-            has_left = node.left is not None
-            has_right = node.right is not None
-            if has_left:
-                # Left is 'last' only if there is no right sibling
-                _visit(node.left, new_prefix, not has_right)
-            if has_right:
-                # Right is always 'last' in a binary tree preorder
-                _visit(node.right, new_prefix, True)
-        _visit(self.root, "", True)
+
+    ## Buffer export
+
+    # int32 elements are exported as array('i') does, in native byte
+    # order; uint8 elements as plain bytes.
+
+    def _iter_nodes(self, index: int = 0, reverse: bool = False):
+        """
+        Yields (node, offset) in order (or in reverse), from the node
+        holding element index on; offset is where to start among that
+        first node's elements, then 0 (or -1, the last) for the rest.
+        One descent, then an explicit stack of the nodes still to come.
+        """
+        stack = []
+        offset = 0
+        node = self.root
+        while node:
+            self._push(node)
+            left_size = self._size(node.left)
+            own = node.size - left_size - self._size(node.right)
+            if index < left_size:
+                if not reverse:
+                    stack.append(node)
+                node = node.left
+            elif index < left_size + own:
+                stack.append(node)
+                offset = index - left_size
+                break
+            else:
+                if reverse:
+                    stack.append(node)
+                index -= left_size + own
+                node = node.right
+        while stack:
+            node = stack.pop()
+            yield node, offset
+            offset = -1 if reverse else 0
+            node = node.left if reverse else node.right
+            while node:
+                if node.rev or node.tag:
+                    self._push(node)
+                stack.append(node)
+                node = node.right if reverse else node.left
+
+    def _clamp(self, start: int, stop: int) -> tuple:
+        size = self._size(self.root)
+        stop = size if stop is None else max(0, min(stop, size))
+        return max(0, min(start, stop)), stop
+
+    def _new_buffer(self):
+        if self.cast_fn not in self.TYPES:
+            raise ValueError("buffer export needs cast_fn=int32 or cast_fn=uint8")
+        return self.TYPES[self.cast_fn]()
+
+    def iter_chunks(self, start: int = 0, stop: int = None, batch: int = 4096):
+        """
+        Yields memoryviews over contiguous runs of the elements at indices
+        start <= index < stop (clamped, like a slice). Elements are packed
+        into fresh buffers of up to `batch` elements as the walk goes, so
+        no list of the whole range is built.
+        """
+        start, stop = self._clamp(start, stop)
+        remaining = stop - start
+        buf = self._new_buffer()
+        for node, offset in self._iter_nodes(start):
+            if remaining <= 0:
+                break
+            buf.append(node.key)
+            remaining -= 1
+            if len(buf) >= batch:
+                yield memoryview(buf)
+                buf = self._new_buffer()
+        if buf:
+            yield memoryview(buf)
+
+    def to_bytes(self, start: int = 0, stop: int = None) -> bytes:
+        """The elements at indices start <= index < stop as bytes."""
+        return b"".join(self.iter_chunks(start, stop))
+
+    def readinto(self, buf, start: int = 0, stop: int = None) -> int:
+        """
+        Copies the elements at indices start <= index < stop into a writable
+        buffer, as many whole elements as fit, and returns the number of
+        bytes written (like io's readinto).
+        """
+        out = memoryview(buf).cast("B")
+        itemsize = memoryview(self._new_buffer()).itemsize
+        start, stop = self._clamp(start, stop)
+        stop = min(stop, start + len(out) // itemsize)
+        pos = 0
+        for view in self.iter_chunks(start, stop):
+            raw = view.cast("B")
+            out[pos:pos + len(raw)] = raw
+            pos += len(raw)
+        return pos
+
+###########################
+# Lazy updates for SEQ_AVL.apply
+
+# An update is a tuple of steps, run in order: ("affine", a, b) maps k to
+# a*k + b, ("xor", m) maps k to k ^ m, ("table", t) maps a byte k to t[k].
+# Adjacent steps of one kind fold into one. All kinds are exact modulo
+# 2^w, so int32/uint8 can be applied once, to the final value, and their
+# coefficients can be kept reduced mod 2^w (2^8 divides 2^32).
+#
+# SEQ_AVL keeps every pending tag short, so pushing one is O(1): uint8
+# updates always become a single 256-entry table (tables compose by
+# translate), and for other types a node whose tag would grow past
+# max_tag_steps pushes it to its children first.
+
+def affine(mul: int, add: int = 0) -> tuple:
+    return (("affine", mul, add),)
+
+def xor(mask: int) -> tuple:
+    return (("xor", mask),)
+
+def byte_table(update) -> tuple:
+    """An update of bytes as the equivalent single ("table", t) step."""
+    return (("table", bytes(run_update(update, k) & 0xFF for k in range(256))),)
+
+def compose_updates(first, second, mask: int = None) -> tuple:
+    """
+    The update that runs first, then second (either may be None). mask
+    (2^w - 1) reduces the folded coefficients for w-bit elements.
+    """
+    if not first:
+        return second
+    if not second:
+        return first
+    a, b = first[-1], second[0]
+    if a[0] != b[0]:
+        return first + second
+    if a[0] == "affine":
+        mul, add = a[1] * b[1], a[2] * b[1] + b[2]
+        merged = ("affine", mul, add) if mask is None else ("affine", mul & mask, add & mask)
+    elif a[0] == "xor":
+        merged = ("xor", a[1] ^ b[1] if mask is None else (a[1] ^ b[1]) & mask)
+    else:
+        merged = ("table", a[1].translate(b[1]))
+    return first[:-1] + (merged,) + second[1:]
+
+def run_update(update, key):
+    for step in update:
+        if step[0] == "affine":
+            key = key * step[1] + step[2]
+        elif step[0] == "xor":
+            key ^= step[1]
+        else:
+            key = step[1][key & 0xFF]
+    return key
+
+###########################
+# Packed-leaf mode
+
+class PACKED_SEQ_AVL(SEQ_AVL):
+    """
+    SEQ_AVL storing its elements in typed chunks of up to `chunk` elements:
+    array('i') for int32, bytearray for uint8. Every node holds one chunk
+    as its key, and node.size counts elements, so the AVL indexes chunks
+    and search(index) is O(log(n/B)) plus an O(1) lookup in the chunk.
+    An insert into a full chunk splits it in two. A delete that leaves a
+    chunk under a quarter full merges the next chunk into it if both fit.
+    Range operations (split/concat/insert_range/delete_range/reverse/
+    apply) merge or even out the chunks at each seam they rejoin.
+    search returns the element itself rather than a Node.
+    """
+    class Node(SEQ_AVL.Node):
+        def __init__(self, chunk):
+            super().__init__(chunk)
+
+    def __init__(self, cast_fn=int32, chunk: int = 512):
+        if cast_fn not in self.TYPES:
+            raise ValueError("PACKED_SEQ_AVL needs cast_fn=int32 or cast_fn=uint8")
+        super().__init__(cast_fn)
+        self.chunk = chunk
+
+    def _new_chunk(self, keys=()):
+        c = self._new_buffer()
+        c.extend(self.cast_fn(k) for k in keys)
+        return c
+
+    def _update(self, n):
+        if not n:
+            return None
+        n.height = 1 + max(self._height(n.left), self._height(n.right))
+        n.size = len(n.key) + self._size(n.left) + self._size(n.right)
+        return n
+
+    def _apply_rev(self, n):
+        if n:
+            n.key.reverse()
+            super()._apply_rev(n)
+
+    def _apply_tag(self, n, update):
+        if not n:
+            return
+        if self.cast_fn is uint8:
+            # apply() turns every byte update into a table
+            n.key[:] = n.key.translate(update[0][1])
+        else:
+            n.key[:] = array("i", (int32(run_update(update, k)) for k in n.key))
+        n.tag = self._stack_tag(n, update)
+
+    def _remove_root(self, node):
+        """Unlinks node from the subtree it is the root of; returns the new root."""
+        if not node.left:
+            return node.right
+        if not node.right:
+            return node.left
+        rest, first = self._pop_first(node.right)
+        first.left, first.right = node.left, rest
+        self._update(first)
+        return self._rebalance(first)
+
+    def _edit(self, node, index, fn):
+        """
+        Descends to the chunk holding element index (a chunk also takes the
+        index just past its end when nothing lies to its right) and calls
+        fn(node, offset). fn edits the chunk and returns None to keep the
+        node, "remove" to unlink it, or an overflow chunk to link in right
+        after it. Sizes and balance are fixed on the way back up.
+        """
+        self._push(node)
+        left_size = self._size(node.left)
+        if index < left_size:
+            node.left = self._edit(node.left, index, fn)
+        elif index - left_size < len(node.key) or not node.right:
+            result = fn(node, index - left_size)
+            if result == "remove":
+                return self._remove_root(node)
+            if result is not None:
+                node.right = self._join(None, PACKED_SEQ_AVL.Node(result), node.right)
+        else:
+            node.right = self._edit(node.right, index - left_size - len(node.key), fn)
+        self._update(node)
+        return self._rebalance(node)
+
+    def _locate(self, index: int):
+        """(node, offset) of element index, or (None, 0)."""
+        node = self.root
+        while node:
+            self._push(node)
+            left_size = self._size(node.left)
+            if index < left_size:
+                node = node.left
+            elif index - left_size < len(node.key):
+                return node, index - left_size
+            else:
+                index -= left_size + len(node.key)
+                node = node.right
+        return None, 0
+
+    def search(self, index: int):
+        if index < 0:
+            return None
+        node, offset = self._locate(index)
+        return node.key[offset] if node else None
+
+    def insert(self, index: int, key):
+        key = self.cast_fn(key)
+        if not self.root:
+            self.root = PACKED_SEQ_AVL.Node(self._new_chunk((key,)))
+            return self.root
+        def _insert(node, offset):
+            node.key.insert(offset, key)
+            if len(node.key) > self.chunk:
+                tail = node.key[len(node.key) // 2:]
+                del node.key[len(node.key) // 2:]
+                return tail
+        self.root = self._edit(self.root, max(0, min(index, self._size(self.root))), _insert)
+        return self.root
+
+    def delete(self, index: int):
+        if not 0 <= index < self._size(self.root):
+            return self.root
+        small = []
+        def _delete(node, offset):
+            del node.key[offset]
+            if not node.key:
+                return "remove"
+            if len(node.key) < self.chunk // 4:
+                small.append((node.key, index - offset))
+        self.root = self._edit(self.root, index, _delete)
+        if small:
+            chunk, start = small[0]
+            after = start + len(chunk)
+            following, offset = self._locate(after)
+            if following and offset == 0 and len(chunk) + len(following.key) <= self.chunk:
+                moved = []
+                def _take(node, offset):
+                    moved.append(node.key)
+                    return "remove"
+                self.root = self._edit(self.root, after, _take)
+                def _extend(node, offset):
+                    node.key = node.key + moved[0]
+                self.root = self._edit(self.root, start, _extend)
+        return self.root
+
+    def _split(self, node, index):
+        if not node:
+            return None, None
+        self._push(node)
+        left_size = self._size(node.left)
+        end = left_size + len(node.key)
+        if index <= left_size:
+            left, right = self._split(node.left, index)
+            return left, self._join(right, node, node.right)
+        if index >= end:
+            left, right = self._split(node.right, index - end)
+            return self._join(node.left, node, left), right
+        # The cut falls inside this chunk. Both halves are new buffers, so a
+        # chunk exported by iter_chunks is never resized (BufferError) after
+        # the nodes have already been relinked.
+        offset = index - left_size
+        tail = PACKED_SEQ_AVL.Node(node.key[offset:])
+        node.key = node.key[:offset]
+        right = node.right
+        return self._join(node.left, node, None), self._join(None, tail, right)
+
+    def _join2(self, left, right):
+        """
+        Links left + right. The chunks that meet at the seam are merged into
+        one new buffer while they fit and the result is under half full; a
+        pair too big to merge is evened out if either is under half full.
+        Every range operation rejoins its pieces here, so the cuts made by
+        _split do not accumulate.
+        """
+        if not (left and right):
+            return super()._join2(left, right)
+        spine = []
+        node = left
+        while node:
+            self._push(node)
+            spine.append(node)
+            node = node.right
+        last = spine[-1]
+        half_full = self.chunk // 2
+        while right:
+            right, first = self._pop_first(right)
+            if len(last.key) + len(first.key) <= self.chunk:
+                last.key, first = last.key + first.key, None
+                if len(last.key) >= half_full:
+                    break
+            else:
+                if min(len(last.key), len(first.key)) < half_full:
+                    combined = last.key + first.key
+                    half = len(combined) // 2
+                    last.key, first.key = combined[:half], combined[half:]
+                break
+        for node in reversed(spine):
+            self._update(node)
+        if first is None:
+            return super()._join2(left, right)
+        return self._join(left, self._update(first), right)
+
+    def _build(self, keys):
+        chunks = [self._new_chunk(keys[i:i + self.chunk]) for i in range(0, len(keys), self.chunk)]
+        def _build_range(lo, hi):
+            if lo >= hi:
+                return None
+            mid = (lo + hi) // 2
+            node = PACKED_SEQ_AVL.Node(chunks[mid])
+            node.left = _build_range(lo, mid)
+            node.right = _build_range(mid + 1, hi)
+            return self._update(node)
+        return _build_range(0, len(chunks))
+
+    def _wrap(self, root):
+        t = PACKED_SEQ_AVL(self.cast_fn, self.chunk)
+        t.root = root
+        return t
+
+    @classmethod
+    def join(cls, left, pivot, right):
+        t = cls(left.cast_fn, left.chunk)
+        t.root = t._join(left.root, PACKED_SEQ_AVL.Node(t._new_chunk((pivot,))), right.root)
+        left.root = right.root = None
+        return t
+
+    def iter_chunks(self, start: int = 0, stop: int = None, batch: int = None):
+        """
+        Yields memoryviews straight into the chunks (no copies), covering
+        the elements at indices start <= index < stop. Range operations
+        cut and merge chunks into new buffers, so they work while views
+        are alive. insert and delete resize a chunk in place and raise
+        BufferError, changing nothing, if that chunk is still exported.
+        """
+        start, stop = self._clamp(start, stop)
+        remaining = stop - start
+        for node, offset in self._iter_nodes(start):
+            if remaining <= 0:
+                break
+            take = min(len(node.key) - offset, remaining)
+            yield memoryview(node.key)[offset:offset + take]
+            remaining -= take
+
+    def iter_from(self, index: int, reverse: bool = False):
+        """Yields the elements from index on (or down), chunk by chunk."""
+        size = self._size(self.root)
+        index = min(index, size - 1) if reverse else max(index, 0)
+        if 0 <= index < size:
+            for node, offset in self._iter_nodes(index, reverse):
+                chunk = node.key
+                if reverse:
+                    yield from reversed(chunk) if offset == -1 else chunk[offset::-1]
+                else:
+                    yield from chunk[offset:] if offset else chunk
 
 ###########################
 # Utility functions / tests